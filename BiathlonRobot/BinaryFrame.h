@@ -0,0 +1,71 @@
+#ifndef BINARY_FRAME_H
+#define BINARY_FRAME_H
+
+// --- OPTIONAL BINARY FRAMING ---
+// ASCII (LOG:/SOLANA_RECORD:/burst lines) stays the default.
+// Set to true here AND set SERIAL_PROTOCOL = "binary" in GroundStation/bridge.py
+#define BINARY_FRAMING false
+
+// Frame on the wire: COBS( TYPE | PAYLOAD | CRC16 ) followed by a 0x00 delimiter
+// CRC16 is CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) over TYPE + PAYLOAD, little-endian
+const byte FRAME_TELEMETRY = 'T';  // uint32 time, int32 left, int32 right, int16 dist
+const byte FRAME_RECORD = 'R';     // int16 score, uint32 time
+const byte FRAME_BURST = 'B';      // N x LogEvent (uint32 time, uint8 type, int16 value)
+const byte FRAME_BURST_END = 'E';  // uint16 total event count
+
+#define MAX_FRAME_PAYLOAD 224      // 32 LogEvents per burst frame
+
+uint16_t crc16(const byte* data, size_t len) {
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < len; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (byte b = 0; b < 8; b++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+// Consistent Overhead Byte Stuffing: removes every 0x00 so it can delimit frames
+size_t cobsEncode(const byte* in, size_t len, byte* out) {
+  size_t codeIndex = 0;
+  size_t outIndex = 1;
+  byte code = 1;
+  for (size_t i = 0; i < len; i++) {
+    if (in[i] == 0) {
+      out[codeIndex] = code;
+      codeIndex = outIndex++;
+      code = 1;
+    } else {
+      out[outIndex++] = in[i];
+      if (++code == 0xFF) {
+        out[codeIndex] = code;
+        codeIndex = outIndex++;
+        code = 1;
+      }
+    }
+  }
+  out[codeIndex] = code;
+  return outIndex;
+}
+
+void sendFrame(byte type, const byte* payload, size_t len) {
+  static byte raw[MAX_FRAME_PAYLOAD + 3];
+  static byte encoded[MAX_FRAME_PAYLOAD + 5];
+
+  raw[0] = type;
+  memcpy(raw + 1, payload, len);
+  uint16_t crc = crc16(raw, len + 1);
+  raw[len + 1] = crc & 0xFF;
+  raw[len + 2] = crc >> 8;
+
+  size_t n = cobsEncode(raw, len + 3, encoded);
+  Serial.write(encoded, n);
+  Serial.write((byte)0);
+}
+
+// Little-endian field packing (portable, no struct padding surprises)
+byte* putU16(byte* p, uint16_t v) { p[0] = v & 0xFF; p[1] = v >> 8; return p + 2; }
+byte* putU32(byte* p, uint32_t v) { p = putU16(p, v & 0xFFFF); return putU16(p, v >> 16); }
+
+#endif
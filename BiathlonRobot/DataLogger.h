@@ -1,6 +1,8 @@
 #ifndef DATA_LOGGER_H
 #define DATA_LOGGER_H
 
+#include "BinaryFrame.h"
+
 // --- MEMORY OPTIMIZATION ---
 // We can store ~500 events safely in RAM
 #define MAX_LOGS 500
@@ -33,6 +35,29 @@ void logEvent(byte type, int value) {
 // THE BURST FUNCTION
 // Trigger this when you detect Serial connection at the Re-upload point
 void dumpData() {
+  if (BINARY_FRAMING) {
+    // Packed events, 32 per frame. Serial.write blocks when the TX buffer is
+    // full, so no per-event delay is needed.
+    static byte payload[MAX_FRAME_PAYLOAD];
+    byte* p = payload;
+    for (int i = 0; i < logIndex; i++) {
+      p = putU32(p, logs[i].timestamp);
+      *p++ = logs[i].type;
+      p = putU16(p, (uint16_t)logs[i].value);
+      if (p - payload + 7 > MAX_FRAME_PAYLOAD) {
+        sendFrame(FRAME_BURST, payload, p - payload);
+        p = payload;
+      }
+    }
+    if (p != payload) {
+      sendFrame(FRAME_BURST, payload, p - payload);
+    }
+    byte count[2];
+    putU16(count, (uint16_t)logIndex);
+    sendFrame(FRAME_BURST_END, count, sizeof(count));
+    return;
+  }
+
   Serial.println("---BEGIN_BURST---");
   for (int i = 0; i < logIndex; i++) {
     // Format: TIME:TYPE:VALUE
@@ -1,3 +1,5 @@
+#include "BinaryFrame.h"
+
 #define DEBUG_MODE false       // Set to false for competition run
 #define TELEMETRY_RATE 100    // How often to log in ms (avoid flooding Serial)
 
@@ -49,7 +51,18 @@ void logTelemetry() {
     duration = pulseIn(ECHO_PIN, HIGH);
     distance = duration * 0.034 / 2;
 
-    // 2. Format Output for Serial Plotter / Monitor
+    // 2a. Binary mode: one packed, CRC-checked frame instead of ~10 prints
+    if (BINARY_FRAMING) {
+      byte payload[14];
+      byte* p = putU32(payload, millis());
+      p = putU32(p, (uint32_t)leftTicks);
+      p = putU32(p, (uint32_t)rightTicks);
+      putU16(p, (uint16_t)distance);
+      sendFrame(FRAME_TELEMETRY, payload, sizeof(payload));
+      return;
+    }
+
+    // 2b. Format Output for Serial Plotter / Monitor
     // Format: "TIME | L_TICKS | R_TICKS | DIST_CM | STATE"
     Serial.print("LOG:");
     Serial.print(millis());
@@ -69,6 +82,13 @@ void logTelemetry() {
 void sendSolanaHandshake(int finalScore, long runTimeMs) {
   // Ensure we don't have dangling characters
   Serial.flush(); 
+
+  if (BINARY_FRAMING) {
+    byte payload[6];
+    putU32(putU16(payload, (uint16_t)finalScore), (uint32_t)runTimeMs);
+    sendFrame(FRAME_RECORD, payload, sizeof(payload));
+    return;
+  }
   
   // Protocol: SOLANA_RECORD:<SCORE>:<TIME>
   Serial.print("SOLANA_RECORD:");
@@ -1,32 +1,148 @@
-from flask import Flask, render_template, jsonify, request, session, render_template_string
+from flask import Flask, Blueprint, Response, current_app, g, render_template, jsonify, request, session, render_template_string, send_from_directory, url_for
+from markupsafe import Markup
+from werkzeug.local import LocalProxy
+from werkzeug.security import safe_join
+from flask_session import Session
+import base64
+import click
+import hashlib
 import json
+import math
+import mimetypes
 import os
 from datetime import datetime, timedelta
 import uuid
 import random
+import threading
+import time
+from concurrent.futures import TimeoutError as BetTimeout
+import metrics
+import lmsr
+from ledger import get_ledger, InsufficientBalance, MarketClosed, POSITIONS
+from betwriter import BetWriter
+from settlement import settle_race
+from stream import Broadcaster
+from statebus import StateSubscriber
+from store import get_store
+import archive
+import downsample
 
-app = Flask(__name__)
-app.secret_key = 'olympimarket_secret_key_2026'
+# Routes live on a blueprint; create_app() builds a configured app around it
+bp = Blueprint('olympimarket', __name__, cli_group=None)
+SECRET_KEY = 'olympimarket_secret_key_2026'
 
 # Data file paths
 RACE_STATE_FILE = 'race_state.json'
 BETS_FILE = 'bets.json'
+LEDGER_BACKEND = 'sqlite'  # 'sqlite' (bets.db) or 'json' (legacy bets.json)
+LEDGER_DB = 'bets.db'
+
+# Shared state: 'local' (this process only), 'sqlite' (all workers on one host) or 'redis'
+STORE_BACKEND = 'local'
+STORE_URL = None
+SESSION_TYPE = None  # None keeps Flask's signed cookie; 'filesystem' or 'redis' stores sessions server-side
+METRICS_ENABLED = False  # Latency histograms at /metrics and the sampling profiler at /metrics/profile
+
+# Per-app resources, built by create_app() into app.extensions['olympimarket']. These proxies
+# resolve to the current app's, so a second app in the same process doesn't replace the first's.
+def _resource(name):
+    return LocalProxy(lambda: current_app.extensions['olympimarket'][name])
+
+ledger = _resource('ledger')
+bet_writer = _resource('bet_writer')
+store = _resource('store')
+broadcaster = _resource('broadcaster')
+state_bus = _resource('state_bus')
 
 # DEBUG MODE - Set to True for demo
 DEBUG_MODE = True
+DEMO_SEED = None  # Seed for debug race states and demo markets, so a load run can be repeated exactly
+demo_random = random.Random()
+# Initial demo races and selected race; the live copies are kept in the store
 DEMO_RACES = [
     {"id": 1, "name": "Biathlon Challenge", "robot": "BiathlonBot", "status": "READY"},
     {"id": 2, "name": "Speed Trial", "robot": "FastBot", "status": "RUNNING"},
     {"id": 3, "name": "Obstacle Course", "robot": "NavigatorBot", "status": "FINISHED"},
     {"id": 4, "name": "Endurance Test", "robot": "PowerBot", "status": "READY"},
 ]
-CURRENT_RACE_ID = 2  # Which race to display on dashboard
+DEFAULT_RACE_ID = 2  # Which race to display on dashboard
+MAX_QUOTES = 100  # Order sizes priced per /api/markets/<race_id>/quote request
+
+# History pages: keyset (timestamp, id) cursors keep every page the same cost
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+RECENT_POSITIONS = 10  # Shown on the dashboard; the rest are on /history
+EXPORT_BATCH = 500
+MAX_CHART_POINTS = 10000  # Upper bound for ?points= on downsampled telemetry
+
+# Bets are group-committed: one ledger transaction (and fsync) per batch, see betwriter.py
+BET_BATCH_WINDOW = 0.002  # Seconds to collect bets into a batch
+BET_TIMEOUT = 10.0  # Seconds a request waits for its batch before answering 503
+MAX_IDEMPOTENCY_KEY = 128  # Characters allowed in an Idempotency-Key header
+
+# HTTP caching: ETags from the state version, a shared market fragment and fingerprinted static assets
+MARKET_FRAGMENT_TTL = 1.0  # Seconds every viewer of / shares one rendered race status and market fragment
+ASSET_DIR = 'dist'  # Under static/: fingerprinted, precompressed copies written by build_static.py
+ASSET_MANIFEST = 'manifest.json'  # {source name: fingerprinted name} in ASSET_DIR
+ASSET_MAX_AGE = 365 * 24 * 3600  # Fingerprinted names change with their content, so they never need revalidating
+ASSET_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))  # Preference order for precompressed variants
+
+# Live updates: how often the shared /api/stream producer checks for changes
+STREAM_INTERVAL = 1.0
+MAX_STREAMS = 12  # Open /api/stream connections per worker; keep below gunicorn's threads so other requests get one
+STREAM_FULL_RETRY = 30  # Seconds a refused stream client polls before trying again (Retry-After)
+
+# ===== FILE CACHE =====
+# Parsed file contents keyed on (mtime_ns, size, inode), so unchanged files aren't reparsed.
+# Cached objects are shared between requests: don't mutate them.
+_file_cache = {}
+_cache_lock = threading.Lock()
+cache_stats = {'hits': 0, 'misses': 0}
+_fragment_cache = {}  # name -> (state version, expires at, html)
 
+def file_version(path):
+    """Stat key for a file (plus its SQLite WAL, whose writes don't touch the main file)"""
+    version = []
+    for p in (path, path + '-wal'):
+        try:
+            st = os.stat(p)
+        except FileNotFoundError:
+            if p == path:
+                raise
+            continue
+        version.append((st.st_mtime_ns, st.st_size, st.st_ino))
+    return tuple(version)
+
+def cached_load(path, loader):
+    """Return loader(path), only calling it again once the file has changed"""
+    # Stat before reading: if the file changes mid-read we just reload next time
+    version = file_version(path)
+    with _cache_lock:
+        entry = _file_cache.get(path)
+        if entry is not None and entry[0] == version:
+            cache_stats['hits'] += 1
+            return entry[1]
+        cache_stats['misses'] += 1
+    value = loader(path)
+    with _cache_lock:
+        _file_cache[path] = (version, value)
+    return value
+
+def read_json(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    metrics.count_json('parsed', len(data))
+    return json.loads(data)
+
+@metrics.timed
 def load_race_state():
     """Load current robot race state"""
+    # Latest frame pushed by bridge.py; the file is only a fallback snapshot
+    frame = state_bus.get()
+    if frame is not None:
+        return frame
     try:
-        with open(RACE_STATE_FILE, 'r') as f:
-            return json.load(f)
+        return cached_load(RACE_STATE_FILE, read_json)
     except:
         if DEBUG_MODE:
             return get_debug_race_state()
@@ -34,14 +150,16 @@ def load_race_state():
 
 def get_debug_race_state():
     """Generate demo race state based on current race ID"""
-    race = next((r for r in DEMO_RACES if r["id"] == CURRENT_RACE_ID), DEMO_RACES[0])
+    races = get_demo_races()
+    race_id = get_selected_race_id()
+    race = next((r for r in races if r["id"] == race_id), races[0])
     
     # Simulate different states for different races
     if race["status"] == "RUNNING":
-        time_elapsed = random.randint(10, 40)
-        score = time_elapsed * 12 + random.randint(-50, 100)
+        time_elapsed = demo_random.randint(10, 40)
+        score = time_elapsed * 12 + demo_random.randint(-50, 100)
     elif race["status"] == "FINISHED":
-        time_elapsed = random.choice([32, 38, 45, 52])  # Include some failures
+        time_elapsed = demo_random.choice([32, 38, 45, 52])  # Include some failures
         score = (time_elapsed * 12) if time_elapsed < 45 else (time_elapsed * 8)
     else:
         time_elapsed = 0
@@ -54,21 +172,14 @@ def get_debug_race_state():
         "race_id": race["id"],
         "race_name": race["name"],
         "robot": race["robot"],
-        "races": DEMO_RACES
+        "races": races
     }
 
-def load_bets():
-    """Load all bets from file"""
-    try:
-        with open(BETS_FILE, 'r') as f:
-            return json.load(f)
-    except:
-        return {}
-
+@metrics.timed
 def save_bets(bets_data):
-    """Save bets to file"""
-    with open(BETS_FILE, 'w') as f:
-        json.dump(bets_data, f, indent=2)
+    """Replace all bets in the ledger"""
+    ledger.save_all(bets_data)
+    bet_writer.forget()
 
 def get_user_id():
     """Get or create user session ID"""
@@ -76,208 +187,570 @@ def get_user_id():
         session['user_id'] = str(uuid.uuid4())
     return session['user_id']
 
-def get_market_data():
-    """Calculate market data (odds, total volume, etc.)"""
-    state = load_race_state()
-    bets = load_bets()
-    
+def encode_cursor(position):
+    """Opaque page cursor for the position a page ended on"""
+    key = json.dumps([position['timestamp'], position['id']])
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """(timestamp, id) key from a cursor; ValueError if it's malformed"""
+    try:
+        timestamp, position_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(timestamp, str) or not isinstance(position_id, str):
+        raise ValueError("Invalid cursor")
+    return timestamp, position_id
+
+def get_positions_page(user_id, limit, cursor=None):
+    """One page of a user's positions, newest first, and the cursor for the next page (or None)"""
+    before = decode_cursor(cursor) if cursor else None
+    # Fetch one extra row to know whether there is a next page
+    positions = ledger.positions_page(user_id, limit + 1, before)
+    next_cursor = encode_cursor(positions[limit - 1]) if len(positions) > limit else None
+    return positions[:limit], next_cursor
+
+def get_demo_races():
+    return store.get('demo_races', DEMO_RACES)
+
+def get_selected_race_id():
+    """Race picked on the debug panel (shared by all workers)"""
+    return store.get('current_race_id', DEFAULT_RACE_ID)
+
+def get_current_race_id(state=None):
+    """Race that new bets and the market display belong to"""
+    if state is None:
+        state = load_race_state()
+    return state.get('race_id') or get_selected_race_id()
+
+@metrics.timed
+def get_market_data(race_id=None):
+    """Calculate market data (odds, total volume, etc.) for one race, the current one by default"""
+    if race_id is None:
+        race_id = get_current_race_id()
+    return get_markets([race_id])[race_id]
+
+def get_markets(race_ids):
+    """Market data for several races at once: {race_id: market}"""
     if DEBUG_MODE:
-        # Generate demo market data for current race
-        race_id = state.get('race_id', 1)
-        success_bets = random.randint(500, 2000)
-        fail_bets = random.randint(300, 1500)
-    else:
-        success_bets = sum(b['amount'] for b in bets.values() if b.get('position') == 'SUCCESS')
-        fail_bets = sum(b['amount'] for b in bets.values() if b.get('position') == 'FAIL')
-    
+        # Generate demo market data
+        return {race_id: market_summary(demo_market()) for race_id in race_ids}
+    # Aggregates are maintained by the ledger on every bet, so this is one lookup per race
+    return {race_id: market_summary(m) for race_id, m in ledger.markets(race_ids).items()}
+
+def demo_market():
+    success_bets = demo_random.randint(500, 2000)
+    fail_bets = demo_random.randint(300, 1500)
+    return {
+        'success_volume': success_bets,
+        'fail_volume': fail_bets,
+        'participants': demo_random.randint(5, 50),
+        'open_interest': success_bets + fail_bets,
+        'success_shares': demo_random.uniform(0, 600),
+        'fail_shares': demo_random.uniform(0, 600)
+    }
+
+def market_summary(market):
+    """Odds and totals from a race's ledger aggregate"""
+    success_bets = market['success_volume']
+    fail_bets = market['fail_volume']
     total = success_bets + fail_bets
-    if total == 0:
-        success_odds = 50
-        fail_odds = 50
-    else:
-        success_odds = (success_bets / total) * 100
-        fail_odds = (fail_bets / total) * 100
+    
+    # Odds are the LMSR market maker's current prices for the outstanding shares
+    success_price, fail_price = lmsr.prices((market['success_shares'], market['fail_shares'])).tolist()
     
     return {
-        'success_odds': round(success_odds, 1),
-        'fail_odds': round(fail_odds, 1),
+        'success_odds': round(success_price * 100, 1),
+        'fail_odds': round(fail_price * 100, 1),
+        'success_price': success_price,
+        'fail_price': fail_price,
+        'success_shares': market['success_shares'],
+        'fail_shares': market['fail_shares'],
         'success_volume': success_bets,
         'fail_volume': fail_bets,
         'total_volume': total,
-        'participants': len(bets) if not DEBUG_MODE else random.randint(5, 50)
+        'participants': market['participants'],
+        'open_interest': market['open_interest']
     }
 
-@app.route('/')
+def get_live_race_ids():
+    """Races that are still taking bets"""
+    if DEBUG_MODE:
+        return [r['id'] for r in get_demo_races() if r['status'] != 'FINISHED']
+    return ledger.live_races()
+
+# ===== HTTP CACHING =====
+
+def state_version():
+    """
+    Key that changes whenever race state or the ledger may have: the hash of the
+    latest state bus frame (or the snapshot file's stat key), the selected race
+    and the ledger file's stat key. Every worker sees the same frames, so they
+    all derive the same key and an ETag from one is honoured by the others.
+    Cheap enough to check before building a response. None in debug mode,
+    whose demo data is regenerated on every read.
+    """
+    if DEBUG_MODE:
+        return None
+    if state_bus.get() is not None:
+        race_state = ('bus', state_bus.frame_digest)
+    else:
+        try:
+            race_state = file_version(RACE_STATE_FILE)
+        except OSError:
+            race_state = None
+    try:
+        ledger_state = file_version(ledger.path)
+    except OSError:
+        ledger_state = None
+    return (race_state, get_selected_race_id(), ledger_state)
+
+def state_etag(*parts):
+    """ETag for a response built from the current state version and `parts`, or None without a version"""
+    version = state_version()
+    if version is None:
+        return None
+    return hashlib.blake2b(repr((version,) + parts).encode('utf-8'), digest_size=12).hexdigest()
+
+def not_modified(etag, private=False):
+    """A 304 if the client already has `etag`, otherwise None"""
+    if etag is None or not request.if_none_match.contains(etag):
+        return None
+    return with_etag(Response(status=304), etag, private)
+
+def with_etag(response, etag, private=False):
+    """Tag a response so clients revalidate it with If-None-Match instead of refetching"""
+    if etag is not None:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+    return response
+
+def cached_fragment(name, ttl, render):
+    """render(), shared by every request for `ttl` seconds or until the state version changes"""
+    version = state_version()
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _fragment_cache.get(name)
+        if entry is not None and entry[0] == version and entry[1] > now:
+            return entry[2]
+    html = render()
+    with _cache_lock:
+        _fragment_cache[name] = (version, now + ttl, html)
+    return html
+
+def render_market_fragment():
+    state = load_race_state()
+    race_id = get_current_race_id(state)
+    return Markup(render_template('_market.html', state=state, market_data=get_market_data(race_id), race_id=race_id))
+
+def load_asset_manifest(static_folder):
+    """{source name: fingerprinted name} written by build_static.py, empty before the first build"""
+    try:
+        with open(os.path.join(static_folder, ASSET_DIR, ASSET_MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+@bp.app_template_global()
+def asset_url(filename):
+    """Fingerprinted URL of a static file once build_static.py has run, its plain /static URL before"""
+    fingerprinted = current_app.config['ASSETS'].get(filename)
+    if fingerprinted is None:
+        return url_for('static', filename=filename)
+    return url_for('olympimarket.asset', filename=fingerprinted)
+
+@bp.route('/assets/<path:filename>')
+def asset(filename):
+    """Fingerprinted static file, precompressed when the client accepts it, cached for a year"""
+    directory = os.path.join(current_app.static_folder, ASSET_DIR)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    for encoding, suffix in ASSET_ENCODINGS:
+        path = safe_join(directory, filename + suffix)
+        if request.accept_encodings[encoding] and path and os.path.isfile(path):
+            response = send_from_directory(directory, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype)
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    response.vary.add('Accept-Encoding')
+    return response
+
+@bp.route('/')
 def index():
     """Main dashboard page"""
-    state = load_race_state()
-    market_data = get_market_data()
     user_id = get_user_id()
     
-    # Get user's bets
-    bets = load_bets()
-    user_bets = bets.get(user_id, {})
-    user_balance = user_bets.get('balance', 1000)
-    user_positions = user_bets.get('positions', [])
+    # Race status and market cards are the same for everyone; only the wallet part is per user
+    market_fragment = cached_fragment('market', MARKET_FRAGMENT_TTL, render_market_fragment)
+    user_balance = ledger.balance(user_id)
+    user_positions, _ = get_positions_page(user_id, RECENT_POSITIONS)
     
     # Add debug flag to template
     return render_template('index.html', 
-                         state=state, 
-                         market_data=market_data,
+                         market_fragment=market_fragment,
                          user_balance=user_balance,
                          user_positions=user_positions,
                          debug_mode=DEBUG_MODE,
-                         demo_races=DEMO_RACES,
-                         current_race_id=CURRENT_RACE_ID)
+                         demo_races=get_demo_races(),
+                         current_race_id=get_selected_race_id())
 
-@app.route('/api/market-data')
+@bp.route('/api/market-data')
 def api_market_data():
-    """API endpoint for market data"""
-    market_data = get_market_data()
+    """API endpoint for market data (304 while the state version is unchanged)"""
+    etag = state_etag('market-data')
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
     state = load_race_state()
-    return jsonify({
+    race_id = get_current_race_id(state)
+    return with_etag(jsonify({
+        'race_id': race_id,
         'status': state.get('status', 'OFFLINE'),
         'time': state.get('time', 0),
         'score': state.get('score', 0),
-        'market': market_data,
+        'market': get_market_data(race_id),
+        'timestamp': datetime.now().isoformat()
+    }), etag)
+
+@bp.route('/api/markets/<int:race_id>')
+def api_race_market(race_id):
+    """Market data for one race"""
+    return jsonify({
+        'race_id': race_id,
+        'market': get_market_data(race_id),
+        'settlement': ledger.settlement(race_id),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@bp.route('/api/markets/<int:race_id>/quote')
+def api_race_quote(race_id):
+    """Shares and average price for many order sizes at once (?position=SUCCESS&amount=10&amount=100)"""
+    position = request.args.get('position')
+    if position not in POSITIONS:
+        return jsonify({'error': 'Invalid position'}), 400
+    # getlist(type=float) would silently drop unparsable values, so count them against the raw list
+    amounts = request.args.getlist('amount', type=float)
+    if (not 1 <= len(amounts) <= MAX_QUOTES or len(amounts) != len(request.args.getlist('amount'))
+            or not all(math.isfinite(a) and a > 0 for a in amounts)):
+        return jsonify({'error': f'Give 1 to {MAX_QUOTES} positive amounts'}), 400
+    market = get_market_data(race_id)
+    book = lmsr.LmsrMarket((market['success_shares'], market['fail_shares']))
+    outcome = POSITIONS.index(position)
+    shares, average = book.quote(outcome, amounts)
+    return jsonify({
+        'race_id': race_id,
+        'position': position,
+        'price': book.price(outcome),
+        'quotes': [{'amount': a, 'shares': s, 'avg_price': p}
+                   for a, s, p in zip(amounts, shares.tolist(), average.tolist())],
         'timestamp': datetime.now().isoformat()
     })
 
-@app.route('/api/place-bet', methods=['POST'])
+@bp.route('/api/markets')
+def api_markets():
+    """Market data for every live race (or ?race_id=1&race_id=2) in one response"""
+    race_ids = request.args.getlist('race_id', type=int) or get_live_race_ids()
+    markets = get_markets(race_ids)
+    return jsonify({
+        'markets': [dict(markets[race_id], race_id=race_id) for race_id in race_ids],
+        'timestamp': datetime.now().isoformat()
+    })
+
+def get_stream_snapshot():
+    """Channels pushed to /api/stream subscribers (each sent only when it changes)"""
+    state = load_race_state()
+    race_id = get_current_race_id(state)
+    return {
+        'state': {
+            'race_id': race_id,
+            'status': state.get('status', 'OFFLINE'),
+            'time': state.get('time', 0),
+            'score': state.get('score', 0)
+        },
+        'market': get_market_data(race_id)
+    }
+
+@bp.route('/api/stream')
+def api_stream():
+    """Server-Sent Events feed of race-state and market changes (503 when this worker has no stream slot left)"""
+    stream = broadcaster.subscribe()
+    if stream is None:
+        return jsonify({'error': 'Too many open streams, poll /api/market-data'}), 503, \
+            {'Retry-After': str(STREAM_FULL_RETRY)}
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/api/place-bet', methods=['POST'])
 def api_place_bet():
     """Place a bet on a market"""
     data = request.json
     user_id = get_user_id()
     position = data.get('position')  # 'SUCCESS' or 'FAIL'
-    amount = float(data.get('amount', 0))
+    try:
+        amount = float(data.get('amount', 0))
+    except (TypeError, ValueError):
+        amount = 0
     
-    if amount <= 0:
+    if not math.isfinite(amount) or amount <= 0:
         return jsonify({'success': False, 'error': 'Invalid amount'}), 400
     
-    bets = load_bets()
-    if user_id not in bets:
-        bets[user_id] = {'balance': 1000, 'positions': []}
+    if position not in POSITIONS:
+        return jsonify({'success': False, 'error': 'Invalid position'}), 400
     
-    user_bets = bets[user_id]
-    if user_bets['balance'] < amount:
-        return jsonify({'success': False, 'error': 'Insufficient balance'}), 400
+    # Bets go to the race in the request, or the one currently on screen
+    race_id = data.get('race_id')
+    if race_id is None:
+        race_id = get_current_race_id()
+    elif not isinstance(race_id, int) or isinstance(race_id, bool) or race_id <= 0:
+        return jsonify({'success': False, 'error': 'Invalid race'}), 400
     
-    # Deduct from balance and add position
-    user_bets['balance'] -= amount
-    user_bets['positions'].append({
-        'id': str(uuid.uuid4()),
-        'position': position,
-        'amount': amount,
-        'timestamp': datetime.now().isoformat(),
-        'status': 'OPEN'
-    })
+    # A retried request with the same key gets the original bet back instead of a second debit
+    request_key = request.headers.get('Idempotency-Key')
+    if request_key is not None and not 0 < len(request_key) <= MAX_IDEMPOTENCY_KEY:
+        return jsonify({'success': False, 'error': 'Invalid Idempotency-Key'}), 400
     
-    save_bets(bets)
-    market_data = get_market_data()
+    # Queued to the group-commit writer: debited, filled at the LMSR price and answered once its batch is durable
+    try:
+        new_balance, record = bet_writer.place_bet(user_id, position, amount, race_id, request_key,
+                                                   timeout=BET_TIMEOUT)
+    except InsufficientBalance:
+        return jsonify({'success': False, 'error': 'Insufficient balance'}), 400
+    except MarketClosed:
+        return jsonify({'success': False, 'error': 'Market closed'}), 400
+    except BetTimeout:
+        return jsonify({'success': False, 'error': 'Bet still pending, retry with the same Idempotency-Key'}), 503
+    
+    broadcaster.poke()
+    market_data = get_market_data(race_id)
     
     return jsonify({
         'success': True,
-        'new_balance': user_bets['balance'],
+        'race_id': race_id,
+        'new_balance': new_balance,
+        'shares': record['shares'],
+        'avg_price': record['amount'] / record['shares'],
         'market_data': market_data
     })
 
-@app.route('/api/user-positions')
+@bp.route('/api/user-positions')
 def api_user_positions():
-    """Get user's current positions"""
+    """Get user's balance and one page of positions, newest first (?limit=50&cursor=...)"""
+    user_id = get_user_id()
+    limit = request.args.get('limit', PAGE_SIZE, type=int)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+    cursor = request.args.get('cursor')
+    etag = state_etag('user-positions', user_id, limit, cursor)
+    cached = not_modified(etag, private=True)
+    if cached is not None:
+        return cached
+    try:
+        positions, next_cursor = get_positions_page(user_id, limit, cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return with_etag(jsonify({
+        'balance': ledger.balance(user_id),
+        'positions': positions,
+        'next_cursor': next_cursor
+    }), etag, private=True)
+
+@bp.route('/api/user-positions/export')
+def api_export_positions():
+    """Every position as newline-delimited JSON, streamed in keyset batches"""
     user_id = get_user_id()
-    bets = load_bets()
     
-    if user_id not in bets:
-        return jsonify({'balance': 1000, 'positions': []})
+    def generate():
+        before = None
+        while True:
+            batch = ledger.positions_page(user_id, EXPORT_BATCH, before)
+            yield ''.join(json.dumps(p) + '\n' for p in batch)
+            if len(batch) < EXPORT_BATCH:
+                return
+            before = (batch[-1]['timestamp'], batch[-1]['id'])
     
-    return jsonify(bets[user_id])
+    return Response(generate(), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename=positions.ndjson'})
 
-@app.route('/history')
+@bp.route('/api/cache-stats')
+def api_cache_stats():
+    """Hit/miss counters for the file cache"""
+    with _cache_lock:
+        lookups = cache_stats['hits'] + cache_stats['misses']
+        return jsonify({
+            'hits': cache_stats['hits'],
+            'misses': cache_stats['misses'],
+            'hit_rate': round(cache_stats['hits'] / lookups, 3) if lookups else None,
+            'entries': len(_file_cache)
+        })
+
+@bp.route('/history')
 def history():
-    """Betting history page"""
+    """Betting history page (one page of positions per request)"""
     user_id = get_user_id()
-    bets = load_bets()
-    user_bets = bets.get(user_id, {})
+    cursor = request.args.get('cursor')
+    try:
+        positions, next_cursor = get_positions_page(user_id, PAGE_SIZE, cursor)
+    except ValueError:
+        return "Invalid cursor", 400
     
-    return render_template('history.html', positions=user_bets.get('positions', []))
+    return render_template('history.html', positions=positions, next_cursor=next_cursor, paged=cursor is not None)
+
+@bp.route('/api/runs/<run_id>/telemetry')
+def api_run_telemetry(run_id):
+    """
+    Archived run telemetry (?from=&to= in ms, ?stream=telemetry|events).
+    Raw NDJSON by default (?downsample=<ms bucket> keeps one record per bucket);
+    ?points=N returns about N chart-ready points as JSON columns instead
+    (?method=lttb|minmax, chosen on ?column=, the first field by default).
+    """
+    stream = request.args.get('stream', 'telemetry')
+    if stream not in archive.STREAMS:
+        return jsonify({'error': 'Invalid stream'}), 400
+    if not archive.has_stream(run_id, stream):
+        return jsonify({'error': 'Run not found'}), 404
+    start = request.args.get('from', type=int)
+    end = request.args.get('to', type=int)
+    points = request.args.get('points', type=int)
+    if points is not None:
+        method = request.args.get('method', 'lttb')
+        if method not in downsample.METHODS:
+            return jsonify({'error': 'Invalid method'}), 400
+        if not 3 <= points <= MAX_CHART_POINTS:
+            return jsonify({'error': f'points must be between 3 and {MAX_CHART_POINTS}'}), 400
+        column = request.args.get('column')
+        try:
+            pyramid = downsample.run_pyramid(run_id, stream, column)
+        except KeyError:
+            return jsonify({'error': 'Invalid column'}), 400
+        if pyramid is None:
+            return jsonify({'error': 'Run not found'}), 404
+        t, columns = pyramid.query(start, end, points, method)
+        return jsonify({'run_id': run_id, 'stream': stream, 'column': pyramid.key, 'method': method,
+                        't': t.tolist(), **{name: values.tolist() for name, values in columns.items()}})
+    bucket_ms = request.args.get('downsample', type=int)
+    if bucket_ms is not None and bucket_ms <= 0:
+        return jsonify({'error': 'downsample must be a positive number of ms'}), 400
+    return Response(archive.read_range(run_id, stream, start, end, bucket_ms),
+                    mimetype='application/x-ndjson')
+
+# ===== METRICS =====
+
+@bp.before_app_request
+def start_request_timer():
+    if metrics.enabled:
+        g.request_start = time.perf_counter()
+        if request.is_json:
+            metrics.count_json('parsed', request.content_length)
+
+@bp.after_app_request
+def record_request(response):
+    if metrics.enabled and 'request_start' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                                        request.method, route, str(response.status_code))
+        if response.mimetype == 'application/json' and not response.is_streamed:
+            metrics.count_json('written', response.content_length)
+    return response
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text format (this worker process only)"""
+    if not metrics.enabled:
+        return 'Metrics disabled', 404
+    frame = state_bus.get() or {}
+    extra = metrics.render_ingest(frame['ingest']) if frame.get('ingest') else []
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/metrics/profile')
+def profile_stacks():
+    """Sample all threads for ?seconds=N and return folded stacks for a flamegraph"""
+    if not metrics.enabled:
+        return 'Metrics disabled', 404
+    seconds = request.args.get('seconds', 10, type=float)
+    return Response(metrics.profile(seconds), mimetype='text/plain')
 
 # ===== DEBUG ENDPOINTS =====
 
-@app.route('/api/debug/races')
+@bp.route('/api/debug/races')
 def api_debug_races():
     """Get all demo races"""
     if not DEBUG_MODE:
         return jsonify({'error': 'Debug mode disabled'}), 403
     return jsonify({
-        'races': DEMO_RACES,
-        'current_race_id': CURRENT_RACE_ID,
+        'races': get_demo_races(),
+        'current_race_id': get_selected_race_id(),
         'debug_mode': DEBUG_MODE
     })
 
-@app.route('/api/debug/race/<int:race_id>')
+@bp.route('/api/debug/race/<int:race_id>')
 def api_debug_set_race(race_id):
     """Switch to a different demo race"""
-    global CURRENT_RACE_ID
     if not DEBUG_MODE:
         return jsonify({'error': 'Debug mode disabled'}), 403
     
-    if not any(r['id'] == race_id for r in DEMO_RACES):
+    if not any(r['id'] == race_id for r in get_demo_races()):
         return jsonify({'error': 'Race not found'}), 404
     
-    CURRENT_RACE_ID = race_id
+    store.set('current_race_id', race_id)
     state = get_debug_race_state()
     market_data = get_market_data()
     
     return jsonify({
         'success': True,
-        'current_race_id': CURRENT_RACE_ID,
+        'current_race_id': race_id,
         'state': state,
         'market_data': market_data
     })
 
-@app.route('/api/debug/simulate')
+@bp.route('/api/debug/simulate')
 def api_debug_simulate():
     """Simulate race progression for current race"""
     if not DEBUG_MODE:
         return jsonify({'error': 'Debug mode disabled'}), 403
     
-    race = next((r for r in DEMO_RACES if r["id"] == CURRENT_RACE_ID), DEMO_RACES[0])
+    race_id = get_selected_race_id()
     
     # Cycle through states
     states = ["READY", "RUNNING", "FINISHED"]
-    current_state = race["status"]
-    next_state = states[(states.index(current_state) + 1) % len(states)]
     
-    # Update race state
-    for r in DEMO_RACES:
-        if r["id"] == CURRENT_RACE_ID:
-            r["status"] = next_state
-            break
+    def advance(races):
+        race = next((r for r in races if r["id"] == race_id), races[0])
+        race["status"] = states[(states.index(race["status"]) + 1) % len(states)]
+        return races
+    
+    # Update race state (atomically, other workers may be advancing it too)
+    races = store.update('demo_races', advance, DEMO_RACES)
+    next_state = next((r for r in races if r["id"] == race_id), races[0])["status"]
     
     state = get_debug_race_state()
+    
+    # Pay out the race as soon as it finishes
+    settlement = None
+    if next_state == 'FINISHED':
+        settlement = settle_race(ledger, race_id, state['time'], state['score'])
+        bet_writer.forget()
+        broadcaster.poke()
     market_data = get_market_data()
     
     return jsonify({
         'success': True,
-        'race_id': CURRENT_RACE_ID,
+        'race_id': race_id,
         'state': state,
         'market_data': market_data,
-        'message': f'Race {CURRENT_RACE_ID} transitioned to {next_state}'
+        'settlement': settlement,
+        'message': f'Race {race_id} transitioned to {next_state}'
     })
 
-@app.route('/api/debug/reset')
+@bp.route('/api/debug/reset')
 def api_debug_reset():
     """Reset all demo data and races"""
     if not DEBUG_MODE:
         return jsonify({'error': 'Debug mode disabled'}), 403
     
-    global CURRENT_RACE_ID
-    
     # Reset races
-    for i, race in enumerate(DEMO_RACES):
-        race['status'] = ['READY', 'RUNNING', 'FINISHED', 'READY'][i % 3]
-    
-    CURRENT_RACE_ID = 2
+    store.set('demo_races', DEMO_RACES)
+    store.set('current_race_id', DEFAULT_RACE_ID)
     
     # Create fresh demo bets
     create_demo_bets()
@@ -288,39 +761,42 @@ def api_debug_reset():
         'races': DEMO_RACES
     })
 
-@app.route('/api/debug/populate-bets')
+@bp.route('/api/debug/populate-bets')
 def api_debug_populate_bets():
     """Generate random demo bets for testing"""
     if not DEBUG_MODE:
         return jsonify({'error': 'Debug mode disabled'}), 403
     
     create_demo_bets()
-    bets = load_bets()
+    user_count = ledger.user_count()
     
     return jsonify({
         'success': True,
-        'message': f'Generated demo bets for {len(bets)} users',
-        'user_count': len(bets)
+        'message': f'Generated demo bets for {user_count} users',
+        'user_count': user_count
     })
 
-def create_demo_bets():
-    """Create demo betting data"""
+def create_demo_bets(n_users=10, max_positions=3):
+    """Create demo betting data (scale n_users up to seed benchmark datasets; DEMO_SEED makes it repeatable)"""
     demo_users = {}
+    race_ids = [r['id'] for r in get_demo_races()]
+    now = datetime.now()
     
-    # Create 10 demo users with various bet positions
-    for i in range(10):
+    # Create demo users with various bet positions
+    for i in range(n_users):
         user_id = f"demo-user-{i}"
-        balance = random.randint(100, 2000)
+        balance = demo_random.randint(100, 2000)
         
         positions = []
-        # Each user has 1-3 positions
-        for j in range(random.randint(1, 3)):
+        # Each user has 1 to max_positions positions
+        for j in range(demo_random.randint(1, max_positions)):
             positions.append({
-                'id': str(uuid.uuid4()),
-                'position': random.choice(['SUCCESS', 'FAIL']),
-                'amount': random.randint(50, 500),
-                'timestamp': (datetime.now() - timedelta(minutes=random.randint(0, 60))).isoformat(),
-                'status': random.choice(['OPEN', 'WON', 'LOST'])
+                'id': str(uuid.UUID(int=demo_random.getrandbits(128), version=4)),
+                'race_id': demo_random.choice(race_ids),
+                'position': demo_random.choice(['SUCCESS', 'FAIL']),
+                'amount': demo_random.randint(50, 500),
+                'timestamp': (now - timedelta(minutes=demo_random.randint(0, 60))).isoformat(),
+                'status': demo_random.choice(['OPEN', 'WON', 'LOST'])
             })
         
         demo_users[user_id] = {
@@ -330,7 +806,23 @@ def create_demo_bets():
     
     save_bets(demo_users)
 
-@app.route('/debug')
+@bp.cli.command('rebuild-markets')
+def rebuild_markets_command():
+    """Recompute market aggregates from the ledger (recovery)"""
+    print(f"Rebuilt {ledger.rebuild_markets()} market aggregates")
+
+@bp.cli.command('settle-race')
+@click.argument('race_id', type=int)
+@click.argument('final_time', type=float)
+@click.argument('final_score', type=int, default=0)
+def settle_race_command(race_id, final_time, final_score):
+    """Settle a finished race by hand (safe to re-run)"""
+    result = settle_race(ledger, race_id, final_time, final_score)
+    action = 'Already settled' if result['replayed'] else 'Settled'
+    print(f"{action} race {race_id}: {result['outcome']}, {result['positions']} positions, "
+          f"pool {result['pool']:.2f}, ratio {result['payout_ratio']:.3f}")
+
+@bp.route('/debug')
 def debug_dashboard():
     """Debug control panel for demo"""
     if not DEBUG_MODE:
@@ -420,9 +912,15 @@ def debug_dashboard():
                 setStatus(`✓ Switched to ${data.state.race_name}`);
             }
             
+            let debugData = null;
+            
             async function updateCurrentRace(raceId) {
                 const res = await fetch('/api/market-data');
-                const data = await res.json();
+                renderCurrentRace(await res.json());
+            }
+            
+            function renderCurrentRace(data) {
+                debugData = data;
                 const stateStr = `
                     <strong>${data.status}</strong><br>
                     Status: ${data.status}<br>
@@ -467,19 +965,100 @@ def debug_dashboard():
                 document.getElementById('status').textContent = msg;
             }
             
+            // Live updates over SSE, polling only while the stream is down
+            let debugPoll = null;
+            function startDebugPolling() {
+                if (!debugPoll) debugPoll = setInterval(updateCurrentRace, 2000);
+            }
+            
+            function connectDebugStream() {
+                if (!window.EventSource) { startDebugPolling(); return; }
+                const stream = new EventSource('/api/stream');
+                stream.addEventListener('state', e => {
+                    if (debugData) renderCurrentRace(Object.assign({}, debugData, JSON.parse(e.data)));
+                });
+                stream.addEventListener('market', e => {
+                    if (debugData) renderCurrentRace(Object.assign({}, debugData, {market: JSON.parse(e.data)}));
+                });
+                stream.onopen = () => { clearInterval(debugPoll); debugPoll = null; };
+                stream.onerror = startDebugPolling;
+            }
+            
             // Load on startup
             loadRaces();
-            setInterval(updateCurrentRace, 2000);
+            connectDebugStream();
         </script>
     </body>
     </html>
     '''
     return render_template_string(html)
 
+def create_app(config=None):
+    """
+    Build a configured app. Call once per process (gunicorn runs it in each
+    worker after forking, see wsgi.py): the ledger connection, state bus
+    subscriber and stream producer belong to the calling process, while
+    mutable state and sessions go through the shared store.
+    """
+    app = Flask(__name__)
+    app.config.from_mapping(
+        SECRET_KEY=SECRET_KEY,
+        LEDGER_BACKEND=LEDGER_BACKEND,
+        LEDGER_DB=LEDGER_DB,
+        STORE_BACKEND=STORE_BACKEND,
+        STORE_URL=STORE_URL,
+        SESSION_TYPE=SESSION_TYPE,
+        SESSION_FILE_DIR='flask_session',
+        METRICS_ENABLED=METRICS_ENABLED,
+        DEMO_SEED=DEMO_SEED,
+        BET_BATCH_WINDOW=BET_BATCH_WINDOW,
+        MAX_STREAMS=MAX_STREAMS,
+    )
+    if config:
+        app.config.update(config)
+
+    demo_random.seed(app.config['DEMO_SEED'])
+    app.config.setdefault('ASSETS', load_asset_manifest(app.static_folder))
+    metrics.enable(app.config['METRICS_ENABLED'])
+    backend = app.config['LEDGER_BACKEND']
+    app_ledger = get_ledger(backend, app.config['LEDGER_DB'] if backend == 'sqlite' else BETS_FILE)
+    app_store = get_store(app.config['STORE_BACKEND'], app.config['STORE_URL'])
+    app_store.setdefault('demo_races', DEMO_RACES)
+    app_store.setdefault('current_race_id', DEFAULT_RACE_ID)
+
+    if app.config['SESSION_TYPE']:
+        if app.config['SESSION_TYPE'] == 'redis' and 'SESSION_REDIS' not in app.config:
+            import redis
+            app.config['SESSION_REDIS'] = redis.Redis.from_url(app.config['STORE_URL'] or 'redis://localhost:6379/0')
+        Session(app)
+
+    def stream_snapshot():
+        # Runs on the producer thread, outside any request
+        with app.app_context():
+            return get_stream_snapshot()
+
+    app_broadcaster = Broadcaster(stream_snapshot, interval=STREAM_INTERVAL, max_subscribers=app.config['MAX_STREAMS'])
+    app.extensions['olympimarket'] = {
+        'ledger': app_ledger,
+        'bet_writer': BetWriter(app_ledger, fill_fn=lmsr.fill, window=app.config['BET_BATCH_WINDOW']),
+        'store': app_store,
+        'broadcaster': app_broadcaster,
+        'state_bus': StateSubscriber(on_change=lambda state: app_broadcaster.poke()),
+    }
+    app.register_blueprint(bp)
+    return app
+
 if __name__ == '__main__':
-    # Initialize demo bets if in debug mode
-    if DEBUG_MODE:
-        if not os.path.exists(BETS_FILE) or os.path.getsize(BETS_FILE) < 5:
-            create_demo_bets()
+    app = create_app()
+    
+    with app.app_context():
+        # Carry over bets from the old JSON store the first time the SQLite ledger starts
+        if LEDGER_BACKEND == 'sqlite' and ledger.user_count() == 0 and os.path.exists(BETS_FILE):
+            print(f"Imported {ledger.import_json(BETS_FILE)} users from {BETS_FILE}")
+        
+        # Initialize demo bets if in debug mode
+        if DEBUG_MODE:
+            if ledger.user_count() == 0:
+                create_demo_bets()
     
     app.run(debug=True, port=5000)
@@ -0,0 +1,173 @@
+import bisect
+import json
+import mmap
+import os
+import re
+from burst import RUNS_DIR, run_dir
+
+# Per-run telemetry archive: runs/<run_id>/<stream>-00000.ndjson, ...
+# Every record is one JSON line starting with {"t":<ms>, so readers can get the
+# timestamp without parsing the rest. Each segment has a sparse index
+# (<segment>.idx, "timestamp offset" every INDEX_EVERY records) so a time-range
+# query seeks straight to the right place instead of scanning the run.
+SEGMENT_BYTES = 8 * 1024 * 1024
+INDEX_EVERY = 256
+FLUSH_EVERY = 64           # Records between flushes, so the app can read a run in progress
+READ_CHUNK = 64 * 1024     # Bytes per chunk yielded by read_range
+STREAMS = ('telemetry', 'events')
+RUN_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-][A-Za-z0-9_.-]*\Z')  # No leading '.', so never '.', '..' or hidden
+
+
+class ArchiveWriter:
+    """Appends timestamp-ordered records to a run's segment-rotated NDJSON archive"""
+
+    def __init__(self, run_id, stream='telemetry', root=RUNS_DIR, segment_bytes=SEGMENT_BYTES):
+        self.dir = run_dir(run_id, root)
+        self.stream = stream
+        self.segment_bytes = segment_bytes
+        self.records = 0
+        self._segment = len(_segments(self.dir, stream))
+        self._file = None
+        self._index = None
+        self._open_segment()
+
+    def _open_segment(self):
+        self.close()
+        base = os.path.join(self.dir, f'{self.stream}-{self._segment:05d}')
+        self._file = open(base + '.ndjson', 'ab')
+        self._index = open(base + '.idx', 'a')
+        self._offset = self._file.tell()
+        self._in_segment = 0
+        self._segment += 1
+
+    def append(self, timestamp, **fields):
+        line = json.dumps({'t': int(timestamp), **fields}, separators=(',', ':')).encode('utf-8') + b'\n'
+        if self._offset and self._offset + len(line) > self.segment_bytes:
+            self._open_segment()
+        if self._in_segment % INDEX_EVERY == 0:
+            self._index.write(f'{int(timestamp)} {self._offset}\n')
+        self._file.write(line)
+        self._offset += len(line)
+        self._in_segment += 1
+        self.records += 1
+        if self.records % FLUSH_EVERY == 0:
+            self.flush()
+
+    def append_events(self, events):
+        """Append a LOG_EVENT_DTYPE array (already in timestamp order)"""
+        for timestamp, type_, value in events.tolist():
+            self.append(timestamp, type=type_, value=value)
+        self.flush()
+
+    def flush(self):
+        # Data before index, so an index entry never points past the end of the data
+        self._file.flush()
+        self._index.flush()
+
+    def close(self):
+        if self._file:
+            self.flush()
+            self._file.close()
+            self._index.close()
+            self._file = self._index = None
+
+
+def _segments(directory, stream):
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(os.path.join(directory, n[:-len('.ndjson')]) for n in names
+                  if n.startswith(stream + '-') and n.endswith('.ndjson'))
+
+
+def _read_index(base):
+    timestamps, offsets = [], []
+    try:
+        with open(base + '.idx') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2:
+                    timestamps.append(int(parts[0]))
+                    offsets.append(int(parts[1]))
+    except FileNotFoundError:
+        pass
+    return timestamps, offsets
+
+
+def _timestamp(line):
+    # Lines are written as {"t":<ms>,...
+    return int(line[5:line.index(b',', 5)])
+
+
+def archive_path(run_id, root=RUNS_DIR):
+    """Directory of a run's archive, or None for ids that aren't plain names"""
+    if not RUN_ID_PATTERN.match(run_id):
+        return None
+    return os.path.join(root, run_id)
+
+
+def has_stream(run_id, stream='telemetry', root=RUNS_DIR):
+    path = archive_path(run_id, root)
+    return path is not None and bool(_segments(path, stream))
+
+
+def iter_records(run_id, stream='telemetry', start=None, end=None, root=RUNS_DIR):
+    """Raw NDJSON lines with start <= t <= end, read through mmap from the nearest index entry"""
+    path = archive_path(run_id, root)
+    segments = _segments(path, stream) if path else []
+    indexes = [_read_index(base) for base in segments]
+    firsts = [ts[0] if ts else None for ts, _ in indexes]
+
+    for i, base in enumerate(segments):
+        timestamps, offsets = indexes[i]
+        # Skip segments that end before the range or start after it
+        following = next((f for f in firsts[i + 1:] if f is not None), None)
+        if start is not None and following is not None and following < start:
+            continue
+        if end is not None and firsts[i] is not None and firsts[i] > end:
+            break
+
+        offset = 0
+        if start is not None and timestamps:
+            j = bisect.bisect_left(timestamps, start) - 1
+            offset = offsets[max(j, 0)]
+
+        with open(base + '.ndjson', 'rb') as f:
+            if os.fstat(f.fileno()).st_size <= offset:
+                continue
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                pos = offset
+                while True:
+                    nl = mm.find(b'\n', pos)
+                    if nl < 0:
+                        break  # Partial line still being written
+                    line = mm[pos:nl + 1]
+                    pos = nl + 1
+                    t = _timestamp(line)
+                    if start is not None and t < start:
+                        continue
+                    if end is not None and t > end:
+                        return
+                    yield t, line
+
+
+def read_range(run_id, stream='telemetry', start=None, end=None, downsample=None, root=RUNS_DIR):
+    """
+    NDJSON bytes for a time range, in chunks of about READ_CHUNK bytes.
+    downsample=N (ms) keeps the first record of every N ms bucket.
+    """
+    chunk, size = [], 0
+    bucket = None
+    for t, line in iter_records(run_id, stream, start, end, root):
+        if downsample:
+            if t // downsample == bucket:
+                continue
+            bucket = t // downsample
+        chunk.append(line)
+        size += len(line)
+        if size >= READ_CHUNK:
+            yield b''.join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield b''.join(chunk)
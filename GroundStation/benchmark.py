@@ -0,0 +1,307 @@
+"""
+Benchmarks for the GroundStation HTTP API.
+
+  python benchmark.py micro --users 10000            # in-process, Flask test client
+  python benchmark.py seed --users 10000 --db bets.db
+  python benchmark.py load --url http://127.0.0.1:8000 --procs 8 --duration 10
+  python benchmark.py settle --positions 1000000 --users 100000
+  python benchmark.py compare benchmarks/old.json benchmarks/new.json
+
+Every run writes its results to benchmarks/<time>-<commit>-<mode>.json so runs
+from different commits can be compared.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+BENCH_DIR = 'benchmarks'
+
+# (name, method, path, share of the load-test request mix)
+ENDPOINTS = [
+    ('index', 'GET', '/', 0.1),
+    ('market-data', 'GET', '/api/market-data', 0.5),
+    ('user-positions', 'GET', '/api/user-positions', 0.2),
+    ('place-bet', 'POST', '/api/place-bet', 0.2),
+]
+BET = {'position': 'SUCCESS', 'amount': 1}
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Latency percentiles (ms) and throughput for one endpoint"""
+    ms = np.asarray(latencies) * 1000.0
+    return {
+        'requests': len(ms),
+        'errors': errors,
+        'rps': round(len(ms) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(float(ms.mean()), 3) if len(ms) else None,
+        'p50_ms': round(float(np.percentile(ms, 50)), 3) if len(ms) else None,
+        'p95_ms': round(float(np.percentile(ms, 95)), 3) if len(ms) else None,
+        'p99_ms': round(float(np.percentile(ms, 99)), 3) if len(ms) else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def save_results(mode, params, results):
+    commit = git_commit()
+    report = {
+        'mode': mode,
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'params': params,
+        'results': results,
+    }
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    path = os.path.join(BENCH_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{commit}-{mode}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def print_results(results):
+    print(f"{'endpoint':<16}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<16}{r['requests']:>10}{r['errors']:>8}{r['rps'] or 0:>10}"
+              f"{r['p50_ms'] or 0:>10}{r['p95_ms'] or 0:>10}{r['p99_ms'] or 0:>10}")
+
+
+def build_app(db_path, users, max_positions, seed, metrics=False):
+    """App on a fresh ledger seeded with `users` synthetic users"""
+    import app as groundstation
+    groundstation.DEBUG_MODE = False  # Real ledger aggregates, not random demo odds
+    flask_app = groundstation.create_app({'LEDGER_DB': db_path, 'STORE_BACKEND': 'local', 'TESTING': True,
+                                          'METRICS_ENABLED': metrics, 'DEMO_SEED': seed})
+    with flask_app.app_context():
+        groundstation.create_demo_bets(users, max_positions)
+    return flask_app
+
+
+# ===== MICRO (Flask test client) =====
+
+def run_micro(args):
+    """Each endpoint in turn through the test client: app + ledger cost, no network"""
+    with tempfile.TemporaryDirectory() as tmp:
+        flask_app = build_app(os.path.join(tmp, 'bench.db'), args.users, args.positions, args.seed, args.metrics)
+
+        # Impersonate seeded users so /api/user-positions reads real position lists
+        rng = random.Random(args.seed)
+        clients = []
+        for user in rng.sample(range(args.users), min(args.clients, args.users)):
+            client = flask_app.test_client()
+            with client.session_transaction() as sess:
+                sess['user_id'] = f"demo-user-{user}"
+            clients.append(client)
+
+        results = {}
+        for name, method, path, _ in ENDPOINTS:
+            for i in range(args.warmup):
+                _request(clients[i % len(clients)], method, path)
+            latencies, errors = [], 0
+            start = time.perf_counter()
+            for i in range(args.requests):
+                t = time.perf_counter()
+                status = _request(clients[i % len(clients)], method, path)
+                latencies.append(time.perf_counter() - t)
+                errors += status >= 400
+            results[name] = summarize(latencies, time.perf_counter() - start, errors)
+    return results
+
+
+def _request(client, method, path):
+    if method == 'POST':
+        return client.post(path, json=BET).status_code
+    return client.get(path).status_code
+
+
+# ===== LOAD (multi-process HTTP) =====
+
+def _load_worker(url, users, start_at, duration, seed, queue):
+    import httpx
+    rng = random.Random(seed)
+    # One cookie jar per virtual user; each gets a fresh session on its first request
+    sessions = [httpx.Client(base_url=url, timeout=30) for _ in range(users)]
+    names = [e[0] for e in ENDPOINTS]
+    weights = [e[3] for e in ENDPOINTS]
+    routes = {e[0]: e[1:3] for e in ENDPOINTS}
+    latencies = {name: [] for name in names}
+    errors = dict.fromkeys(names, 0)
+
+    while time.time() < start_at:
+        time.sleep(0.01)
+    end = start_at + duration
+    while time.time() < end:
+        name = rng.choices(names, weights)[0]
+        method, path = routes[name]
+        client = rng.choice(sessions)
+        t = time.perf_counter()
+        try:
+            response = client.post(path, json=BET) if method == 'POST' else client.get(path)
+            failed = response.status_code >= 400
+        except Exception:
+            failed = True
+        latencies[name].append(time.perf_counter() - t)
+        errors[name] += failed
+    queue.put((latencies, errors))
+
+
+def run_load(args):
+    """Weighted request mix from --procs processes against a running server"""
+    queue = multiprocessing.Queue()
+    start_at = time.time() + args.ramp  # Let every process import and connect first
+    procs = [multiprocessing.Process(target=_load_worker,
+                                     args=(args.url, args.clients, start_at, args.duration, args.seed + i, queue))
+             for i in range(args.procs)]
+    for p in procs:
+        p.start()
+    parts = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    results = {}
+    for name, *_ in ENDPOINTS:
+        latencies = [x for lat, _ in parts for x in lat[name]]
+        results[name] = summarize(latencies, args.duration, sum(err[name] for _, err in parts))
+    everything = [x for lat, _ in parts for values in lat.values() for x in values]
+    results['total'] = summarize(everything, args.duration, sum(sum(err.values()) for _, err in parts))
+    return results
+
+
+# ===== SETTLE (ledger only) =====
+
+def seed_race(ledger, race_id, users, positions, seed, lmsr_share=0.0):
+    """Bulk-insert OPEN positions for one race straight into the ledger tables"""
+    from datetime import datetime
+    from ledger import STARTING_BALANCE
+    rng = np.random.default_rng(seed)
+    owners = rng.integers(0, users, positions)
+    sides = rng.integers(0, 2, positions)
+    amounts = rng.integers(1, 100, positions).astype(float)
+    is_lmsr = rng.random(positions) < lmsr_share
+    timestamp = datetime.now().isoformat()
+    conn = ledger._conn()
+    conn.execute('BEGIN IMMEDIATE')
+    conn.executemany('INSERT OR IGNORE INTO users (user_id, balance) VALUES (?, ?)',
+                     ((f"settle-user-{u}", STARTING_BALANCE) for u in range(users)))
+    conn.executemany(
+        'INSERT INTO positions (id, user_id, race_id, position, amount, shares, timestamp, status) '
+        "VALUES (?, ?, ?, ?, ?, ?, ?, 'OPEN')",
+        ((f"settle-{race_id}-{i}", f"settle-user-{owners[i]}", race_id, ('SUCCESS', 'FAIL')[sides[i]],
+          amounts[i], amounts[i] * 1.8 if is_lmsr[i] else None, timestamp) for i in range(positions)))
+    conn.execute('COMMIT')
+    ledger.rebuild_markets()
+    # Start from a checkpointed file, as a ledger that has been running would, not a 250 MB WAL
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+
+def run_settle(args):
+    """Time SqliteLedger.settle_race on one race with --positions OPEN positions"""
+    from ledger import SqliteLedger
+    from settlement import settle_race
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.repeat):
+            ledger = SqliteLedger(os.path.join(tmp, f"settle-{i}.db"))
+            t = time.perf_counter()
+            seed_race(ledger, 1, args.users, args.positions, args.seed + i, args.lmsr_share)
+            print(f"Seeded {args.positions} positions for {args.users} users in {time.perf_counter() - t:.1f}s")
+            t = time.perf_counter()
+            result = settle_race(ledger, 1, final_time=30.0)
+            elapsed = time.perf_counter() - t
+            print(f"Settled {result['positions']} positions in {elapsed:.3f}s")
+            results.setdefault('settle', []).append(elapsed)
+    return {'settle': summarize(results['settle'], sum(results['settle']))}
+
+
+def run_seed(args):
+    """Seed a ledger file for a load run (point the server's LEDGER_DB at it)"""
+    build_app(args.db, args.users, args.positions, args.seed)
+    print(f"Seeded {args.users} users into {args.db}")
+
+
+def compare(old_path, new_path):
+    """Percent change per endpoint between two result files"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['commit']} -> {new['commit']} ({new['mode']})")
+    for name, r in new['results'].items():
+        before = old['results'].get(name)
+        if not before:
+            continue
+        changes = []
+        for key in ('rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            if before[key] and r[key] is not None:
+                changes.append(f"{key} {(r[key] - before[key]) / before[key] * 100:+.1f}%")
+        print(f"  {name:<16}" + '  '.join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='mode', required=True)
+
+    micro = sub.add_parser('micro', help='in-process benchmark through the Flask test client')
+    micro.add_argument('--users', type=int, default=1000, help='synthetic users seeded into the ledger')
+    micro.add_argument('--positions', type=int, default=3, help='max positions per seeded user')
+    micro.add_argument('--requests', type=int, default=2000, help='timed requests per endpoint')
+    micro.add_argument('--warmup', type=int, default=100)
+    micro.add_argument('--clients', type=int, default=100, help='distinct sessions to rotate through')
+    micro.add_argument('--seed', type=int, default=1)
+    micro.add_argument('--metrics', action='store_true', help='run with /metrics instrumentation enabled')
+
+    load = sub.add_parser('load', help='multi-process HTTP load against a running server')
+    load.add_argument('--url', default='http://127.0.0.1:8000')
+    load.add_argument('--procs', type=int, default=os.cpu_count())
+    load.add_argument('--clients', type=int, default=20, help='virtual users per process')
+    load.add_argument('--duration', type=float, default=10.0)
+    load.add_argument('--ramp', type=float, default=3.0, help='seconds to wait before starting the clock')
+    load.add_argument('--seed', type=int, default=1)
+
+    seed = sub.add_parser('seed', help='seed a ledger file for load runs')
+    seed.add_argument('--db', default='bets.db')
+    seed.add_argument('--users', type=int, default=10000)
+    seed.add_argument('--positions', type=int, default=3)
+    seed.add_argument('--seed', type=int, default=1)
+
+    settle = sub.add_parser('settle', help='time settling one race on a fresh ledger')
+    settle.add_argument('--positions', type=int, default=1000000)
+    settle.add_argument('--users', type=int, default=100000)
+    settle.add_argument('--lmsr-share', type=float, default=0.0, help='fraction of positions holding LMSR shares')
+    settle.add_argument('--repeat', type=int, default=1)
+    settle.add_argument('--seed', type=int, default=1)
+
+    cmp_ = sub.add_parser('compare', help='compare two result files')
+    cmp_.add_argument('old')
+    cmp_.add_argument('new')
+
+    args = parser.parse_args()
+    if args.mode == 'seed':
+        return run_seed(args)
+    if args.mode == 'compare':
+        return compare(args.old, args.new)
+
+    runs = {'micro': run_micro, 'load': run_load, 'settle': run_settle}
+    results = runs[args.mode](args)
+    print_results(results)
+    params = {k: v for k, v in vars(args).items() if k != 'mode'}
+    print(f"Saved {save_results(args.mode, params, results)}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
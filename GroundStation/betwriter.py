@@ -0,0 +1,129 @@
+import logging
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from ledger import InsufficientBalance
+
+BATCH_WINDOW = 0.002   # Seconds the writer keeps collecting after the first queued bet
+MAX_BATCH = 256        # Bets per ledger transaction
+BALANCE_VIEW_SIZE = 100000  # Users whose last known balance is kept; the view is dropped when it grows past this
+
+logger = logging.getLogger(__name__)
+
+
+class BetWriter:
+    """
+    Group commit for bets: request threads queue orders, and one writer thread
+    applies whatever has queued up in a single ledger transaction (one commit,
+    one fsync) every few milliseconds, then answers every request in the batch.
+
+    Orders are checked first against an in-memory view of balances (last value
+    read from the ledger, less bets still queued), so an obviously unaffordable
+    bet is refused without waiting for a batch. The view can be stale when other
+    workers write too: a refusal is confirmed with a fresh ledger read, and the
+    ledger transaction itself still enforces the balance. Orders with a request
+    key are never refused here: they may be retries of a bet that's already
+    committed, which the ledger replays before it looks at the balance.
+    """
+
+    def __init__(self, ledger, fill_fn=None, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.ledger = ledger
+        self.fill_fn = fill_fn
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._balances = {}   # user_id -> balance as of the last ledger read or commit
+        self._pending = {}    # user_id -> total of that user's queued bets
+        self._inflight = {}   # (user_id, request_key) -> Future, so concurrent retries share one bet
+        self.stats = {'bets': 0, 'batches': 0, 'refused': 0}
+        self._thread = None
+
+    def submit(self, user_id, position, amount, race_id, request_key=None):
+        """Queue a bet; returns a Future of (balance, record), raising the ledger's exceptions"""
+        # A NaN would never leave the pending totals, and inf can't be debited
+        if not math.isfinite(amount) or amount <= 0:
+            raise ValueError("Invalid amount")
+        self._ensure_started()
+        with self._lock:
+            if request_key is not None and (user_id, request_key) in self._inflight:
+                return self._inflight[(user_id, request_key)]
+            known = self._balances.get(user_id)
+            pending = self._pending.get(user_id, 0)
+        if known is None or known - pending < amount:
+            # Missing or possibly stale (settlement credits, other workers): read the ledger
+            known = self.ledger.balance(user_id)
+        future = Future()
+        with self._lock:
+            if request_key is None and known - self._pending.get(user_id, 0) < amount:
+                self.stats['refused'] += 1
+                future.set_exception(InsufficientBalance(user_id))
+                return future
+            if len(self._balances) >= BALANCE_VIEW_SIZE:
+                self._balances.clear()
+            self._balances[user_id] = known
+            self._pending[user_id] = self._pending.get(user_id, 0) + amount
+            if request_key is not None:
+                self._inflight[(user_id, request_key)] = future
+        order = {'user_id': user_id, 'position': position, 'amount': amount,
+                 'race_id': race_id, 'request_key': request_key}
+        self._queue.put((order, future))
+        return future
+
+    def place_bet(self, user_id, position, amount, race_id, request_key=None, timeout=None):
+        """Queue a bet and wait until its batch is committed"""
+        return self.submit(user_id, position, amount, race_id, request_key).result(timeout)
+
+    def forget(self):
+        """Drop the balance view (after a settlement credits balances behind its back)"""
+        with self._lock:
+            self._balances.clear()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                results = self.ledger.place_bets([order for order, _ in batch], self.fill_fn)
+            except Exception as e:
+                logger.exception("Bet batch of %d failed", len(batch))
+                results = [e] * len(batch)
+            with self._lock:
+                self.stats['bets'] += len(batch)
+                self.stats['batches'] += 1
+                for (order, _), result in zip(batch, results):
+                    user_id = order['user_id']
+                    self._pending[user_id] -= order['amount']
+                    if self._pending[user_id] <= 1e-9:  # float residue of the queued amounts
+                        del self._pending[user_id]
+                    if isinstance(result, Exception):
+                        self._balances.pop(user_id, None)
+                    else:
+                        self._balances[user_id] = result[0]
+                    self._inflight.pop((user_id, order['request_key']), None)
+            # Answer only after the commit, so every acknowledged bet is durable
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
@@ -1,107 +1,65 @@
-import serial
-import time
-import json
-import random
-import os
-from solders.keypair import Keypair
-from solana.rpc.api import Client
+from statebus import StatePublisher
+from commit_queue import CommitQueue, FakeMemoSender
+from ledger import SqliteLedger
+from simulate import virtual_port
+from supervisor import Supervisor, ReconnectingSerial, COMMIT_BATCH, LEDGER_DB, SETTLE_ON_RECORD, WALLET_PATH
 
 # --- CONFIG ---
+# Run state, archiving, settlement, snapshots and publishing live in supervisor.py
+# (its constants apply here too); this script runs it for a single robot.
 SIMULATION_MODE = True  # <--- SET TO TRUE TO TEST WITHOUT ROBOT
 ARDUINO_PORT = "COM3"   # Ignored if SIMULATION_MODE is True
 BAUD_RATE = 115200
-STATE_FILE = "race_state.json"
-WALLET_PATH = "hackathon-wallet.json"
+SERIAL_PROTOCOL = "ascii"  # "binary" needs BINARY_FRAMING true in BiathlonRobot/BinaryFrame.h
+ROBOT_NAME = "robot"    # Appended to run ids, like every robot the supervisor drives
+RACE_ID = 2             # First race; each later run gets the next free race id (see RobotSession)
+SIM_SEED = 1            # Simulated robot: the same seed replays the same runs
+SIM_SPEED = 1.0         # Simulated time per real second (1 = real time, up to 1000)
 
 # --- INIT ---
 print(f"🚀 Bridge Starting... (Simulation Mode: {SIMULATION_MODE})")
 
-# Reset State File
-initial_state = {"status": "WAITING", "time": 0, "score": 0}
-with open(STATE_FILE, 'w') as f:
-    json.dump(initial_state, f)
+robot = {"robot": ROBOT_NAME, "port": ARDUINO_PORT, "race_id": RACE_ID,
+         # Simulated robots speak ASCII
+         "protocol": "ascii" if SIMULATION_MODE else SERIAL_PROTOCOL, "baud": BAUD_RATE}
 
-# Connect to Serial (only if not simulating)
-ser = None
-if not SIMULATION_MODE:
-    try:
-        ser = serial.Serial(ARDUINO_PORT, BAUD_RATE, timeout=1)
-        print(f"✅ Connected to {ARDUINO_PORT}")
-    except:
-        print("❌ ERROR: Arduino not found. Switch SIMULATION_MODE = True to test.")
-
-def update_ui(status, time_val, score_val):
-    """Writes to JSON for Streamlit"""
-    data = {
-        "status": status,
-        "time": round(time_val, 2),
-        "score": score_val,
-        "last_update": time.time()
-    }
-    # Atomic write to prevent file corruption
-    temp_file = STATE_FILE + ".tmp"
-    with open(temp_file, 'w') as f:
-        json.dump(data, f)
-    os.replace(temp_file, STATE_FILE)
+# Connect to Serial (reopened with backoff while the robot is unplugged), or to a
+# seeded virtual robot that goes through the same parsing path
+if SIMULATION_MODE:
+    def open_port(name, port, baud):
+        return virtual_port("ghost", seed=SIM_SEED, speed=SIM_SPEED)
+    print(f"👻 SIMULATION: seed {SIM_SEED} at {SIM_SPEED}x")
+else:
+    open_port = ReconnectingSerial
 
-# --- SIMULATION VARIABLES ---
-sim_start_time = 0
-sim_running = False
+# --- SETTLEMENT ---
+# Ghost runs never touch real balances
+ledger = SqliteLedger(LEDGER_DB) if SETTLE_ON_RECORD and not SIMULATION_MODE else None
 
-# --- MAIN LOOP ---
-while True:
+# --- ON-CHAIN COMMITS ---
+# Finished runs go into a persistent outbox and are committed in the background,
+# so a slow RPC never stalls the serial loop
+if SIMULATION_MODE:
+    send_memo = FakeMemoSender(latency=0.5)
+else:
     try:
-        # ==========================================
-        # 👻 GHOST MODE (SIMULATION)
-        # ==========================================
-        if SIMULATION_MODE:
-            # Randomly start a race every 10 seconds if not running
-            if not sim_running and random.random() < 0.05:
-                print("👻 SIMULATION: Race Started!")
-                sim_running = True
-                sim_start_time = time.time()
-            
-            if sim_running:
-                elapsed = time.time() - sim_start_time
-                
-                # 1. Simulate Telemetry (Running)
-                if elapsed < 5.0: # Race lasts 5 seconds
-                    # Fake telemetry update
-                    update_ui("RACING", elapsed, 0)
-                    print(f"👻 Simulating Run: {elapsed:.2f}s")
-                
-                # 2. Simulate Finish Line
-                else:
-                    final_score = random.randint(30, 50)
-                    print(f"🏆 SIMULATION FINISH! Time: {elapsed:.2f}s, Score: {final_score}")
-                    update_ui("FINISHED", elapsed, final_score)
-                    
-                    # Pause before resetting
-                    time.sleep(5)
-                    sim_running = False
-                    update_ui("WAITING", 0, 0)
-
-            time.sleep(0.2) # Update speed
-
-        # ==========================================
-        # 🤖 REAL ROBOT MODE
-        # ==========================================
-        elif ser and ser.in_waiting > 0:
-            line = ser.readline().decode('utf-8', errors='ignore').strip()
-            
-            if line.startswith("LOG:"):
-                # LOG:TIME,L,R,DIST,PWM
-                parts = line.split(",")
-                run_time = int(parts[0]) / 1000.0
-                update_ui("RACING", run_time, 0)
-
-            elif line.startswith("SOLANA_RECORD:"):
-                parts = line.split(":")
-                score = int(parts[1])
-                final_time = int(parts[2]) / 1000.0
-                update_ui("FINISHED", final_time, score)
-                # Add blockchain send logic here
-
+        from solana_handler import SolanaOptimizer
+        send_memo = SolanaOptimizer(WALLET_PATH).send_memo
     except Exception as e:
-        print(f"Error: {e}")
-        time.sleep(1)
\ No newline at end of file
+        print(f"⚠️ Solana unavailable ({e}); runs stay in the outbox until next start")
+        send_memo = None
+supervisor = None
+commit_queue = CommitQueue(send_memo, on_commit=lambda ids, sig: supervisor.on_runs_committed(ids, sig),
+                           max_batch=COMMIT_BATCH)
+
+# --- MAIN LOOP ---
+# Publishes the WAITING frame (and resets race_state.json) at once, then runs until interrupted
+supervisor = Supervisor([robot], StatePublisher(), ledger, commit_queue, open_port=open_port).start()
+if send_memo:
+    commit_queue.start()
+try:
+    supervisor.run()
+except KeyboardInterrupt:
+    pass
+supervisor.print_stats()
+supervisor.stop()
@@ -0,0 +1,94 @@
+"""
+Fingerprint and precompress the dashboard's static assets.
+
+  python build_static.py            # static/*.css, static/*.js -> static/dist/
+  python build_static.py --clean    # also delete copies the new manifest no longer uses
+
+Each file is copied to dist/<name>.<hash><ext>, with a .gz (and a .br when the
+brotli package is installed) beside it, and dist/manifest.json maps source
+names to fingerprinted ones. Templates link assets through asset_url(), which
+reads the manifest when a worker starts, so run this before (re)starting the
+app. /assets/ serves the copies with a one-year immutable Cache-Control.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from app import ASSET_DIR, ASSET_MANIFEST, ASSET_ENCODINGS
+
+STATIC_DIR = 'static'
+EXTENSIONS = ('.css', '.js')
+HASH_LENGTH = 12
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+
+def fingerprint(name, data):
+    """main.js -> main.<content hash>.js"""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def compressors():
+    """{file suffix: compress(data)} for every encoding we can produce"""
+    available = {'gzip': lambda data: gzip.compress(data, GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        available['br'] = lambda data: brotli.compress(data, quality=BROTLI_QUALITY)
+    return {suffix: available[encoding] for encoding, suffix in ASSET_ENCODINGS if encoding in available}
+
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def build(static_dir=STATIC_DIR, clean=False):
+    out_dir = os.path.join(static_dir, ASSET_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    encoders = compressors()
+    manifest = {}
+    for name in sorted(os.listdir(static_dir)):
+        if os.path.splitext(name)[1] not in EXTENSIONS:
+            continue
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            data = f.read()
+        target = fingerprint(name, data)
+        manifest[name] = target
+        write(os.path.join(out_dir, target), data)
+        sizes = [f"{len(data)} B"]
+        for suffix, compress in encoders.items():
+            packed = compress(data)
+            # A variant that isn't smaller is never worth sending
+            if len(packed) < len(data):
+                write(os.path.join(out_dir, target + suffix), packed)
+                sizes.append(f"{suffix[1:]} {len(packed)} B")
+        print(f"{name} -> {ASSET_DIR}/{target} ({', '.join(sizes)})")
+
+    write(os.path.join(out_dir, ASSET_MANIFEST), json.dumps(manifest, indent=2).encode('utf-8'))
+    if clean:
+        keep = {ASSET_MANIFEST} | {t + suffix for t in manifest.values() for suffix in ('', *encoders)}
+        for name in os.listdir(out_dir):
+            if name not in keep:
+                os.remove(os.path.join(out_dir, name))
+    if brotli is None:
+        print("brotli not installed (pip install brotli): wrote gzip variants only")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--static', default=STATIC_DIR, help='static folder to build from')
+    parser.add_argument('--clean', action='store_true', help='delete fingerprinted copies no longer in the manifest')
+    args = parser.parse_args()
+    build(args.static, args.clean)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import os
+import numpy as np
+
+# Mirrors the LogEvent struct in BiathlonRobot/DataLogger.h
+LOG_EVENT_DTYPE = np.dtype([
+    ('timestamp', '<u4'),  # unsigned long, millis()
+    ('type', 'u1'),        # byte, EVENT_* code
+    ('value', '<i2'),      # int, sensor reading / points
+])
+
+# (min, max) of each field, so out-of-range values are rejected instead of wrapping
+FIELD_RANGES = [(np.iinfo(LOG_EVENT_DTYPE[name]).min, np.iinfo(LOG_EVENT_DTYPE[name]).max)
+                for name in LOG_EVENT_DTYPE.names]
+
+EVENT_OBSTACLE = 2
+EVENT_SHOT = 5
+
+RUNS_DIR = 'runs'
+
+
+def parse_event(line):
+    """[time, type, value] from one 'TIME:TYPE:VALUE' line; ValueError if it doesn't fit a LogEvent"""
+    parts = line.split(b':')
+    if len(parts) != 3:
+        raise ValueError("not TIME:TYPE:VALUE")
+    values = [int(p) for p in parts]
+    for v, (lo, hi) in zip(values, FIELD_RANGES):
+        if not lo <= v <= hi:
+            raise ValueError(f"{v} out of range")
+    return values
+
+
+def decode_burst(body):
+    """Decode a burst body of 'TIME:TYPE:VALUE' lines into a LOG_EVENT_DTYPE array"""
+    try:
+        # Fast path: the whole burst in one conversion
+        flat = np.array(body.replace(b':', b' ').split(), dtype=np.int64)
+        if flat.size % 3:
+            raise ValueError("ragged burst")
+        rows = flat.reshape(-1, 3)
+        for column, (lo, hi) in zip(rows.T, FIELD_RANGES):
+            if column.size and (column.min() < lo or column.max() > hi):
+                raise ValueError("field out of range")
+    except (ValueError, OverflowError):
+        # A corrupted line somewhere: keep every line that still parses and fits
+        rows = []
+        for line in body.splitlines():
+            try:
+                rows.append(parse_event(line))
+            except ValueError:
+                pass
+        rows = np.array(rows, dtype=np.int64).reshape(-1, 3)
+
+    events = np.empty(len(rows), dtype=LOG_EVENT_DTYPE)
+    events['timestamp'] = rows[:, 0]
+    events['type'] = rows[:, 1]
+    events['value'] = rows[:, 2]
+    return events
+
+
+def summarize(events):
+    """Headline numbers for a run"""
+    return {
+        'events': int(len(events)),
+        'obstacles_hit': int(np.count_nonzero(events['type'] == EVENT_OBSTACLE)),
+        'final_score': int(events['value'][events['type'] == EVENT_SHOT].sum()),
+        'timestamp': int(events['timestamp'][-1]) if len(events) else 0,
+    }
+
+
+def run_dir(run_id, root=RUNS_DIR):
+    path = os.path.join(root, str(run_id))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def save_burst(run_id, events, root=RUNS_DIR):
+    """Persist a run's events as a .npy file (7 bytes/event, memory-mappable)"""
+    path = os.path.join(run_dir(run_id, root), 'burst.npy')
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, events)
+    os.replace(tmp, path)
+    return path
+
+
+def load_burst(path, mmap=True):
+    return np.load(path, mmap_mode='r' if mmap else None)
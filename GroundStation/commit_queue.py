@@ -0,0 +1,152 @@
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+import time
+from merkle import MerkleTree
+
+OUTBOX_DB = 'outbox.db'
+MEMO_LIMIT = 566  # Max memo bytes that fit in one transaction
+
+
+class CommitQueue:
+    """
+    Background on-chain commits for finished runs.
+
+    submit() writes the run to a SQLite outbox before returning, so nothing is
+    lost if the process dies; pending runs are picked up again on restart. The
+    worker batches up to `max_batch` runs into one memo (a Merkle root over the
+    run roots, trimmed to fit MEMO_LIMIT), sends it with `send_memo(payload)`
+    and retries failures with exponential backoff. `on_commit(run_ids, signature)`
+    is called after each successful batch. status(run_id) returns the proof that
+    links the run root to the committed batch root (merkle.verify_path).
+    """
+
+    def __init__(self, send_memo, path=OUTBOX_DB, on_commit=None,
+                 max_batch=8, linger=2.0, base_backoff=1.0, max_backoff=60.0):
+        self.send_memo = send_memo
+        self.path = path
+        self.on_commit = on_commit
+        self.max_batch = max_batch
+        self.linger = linger
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS outbox (
+            run_id TEXT PRIMARY KEY,
+            root TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            created REAL NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt REAL NOT NULL DEFAULT 0,
+            signature TEXT,
+            batch_root TEXT,
+            proof TEXT
+        )''')
+        self._thread = threading.Thread(target=self._run, name='commit-queue', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, run_id, root_hex, summary):
+        """Durably queue a run's Merkle root for commitment"""
+        with self._lock:
+            self._db.execute('INSERT OR IGNORE INTO outbox (run_id, root, summary, created) VALUES (?, ?, ?, ?)',
+                             (run_id, root_hex, json.dumps(summary), time.time()))
+        self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM outbox WHERE signature IS NULL').fetchone()[0]
+
+    def status(self, run_id):
+        with self._lock:
+            row = self._db.execute('SELECT signature, batch_root, proof, attempts FROM outbox WHERE run_id = ?',
+                                   (run_id,)).fetchone()
+        if row is None:
+            return None
+        return {'signature': row[0], 'batch_root': row[1],
+                'proof': json.loads(row[2]) if row[2] else None, 'attempts': row[3]}
+
+    def _due(self, now):
+        with self._lock:
+            return self._db.execute(
+                'SELECT run_id, root, summary, created FROM outbox '
+                'WHERE signature IS NULL AND next_attempt <= ? ORDER BY created LIMIT ?',
+                (now, self.max_batch)).fetchall()
+
+    def _run(self):
+        while True:
+            now = time.time()
+            rows = self._due(now)
+            # Give a small batch a moment to fill up, unless the oldest run has waited long enough
+            if rows and (len(rows) >= self.max_batch or now - rows[0][3] >= self.linger):
+                self.flush(rows)
+                continue
+            self._wake.wait(self.linger)
+            self._wake.clear()
+
+    def flush(self, rows):
+        """Send one memo for as many of `rows` as fit; returns the signature or None"""
+        while True:
+            payload, tree = build_payload(rows)
+            if len(payload.encode('utf-8')) <= MEMO_LIMIT or len(rows) == 1:
+                break
+            rows = rows[:-1]
+        run_ids = [r[0] for r in rows]
+
+        try:
+            signature = self.send_memo(payload)
+        except Exception as e:
+            print(f"❌ COMMIT FAILED ({len(run_ids)} runs): {e}")
+            self._backoff(run_ids)
+            return None
+
+        with self._lock:
+            self._db.executemany('UPDATE outbox SET signature = ?, batch_root = ?, proof = ? WHERE run_id = ?',
+                                 [(signature, tree.root_hex, json.dumps(tree.proof(i)), run_id)
+                                  for i, run_id in enumerate(run_ids)])
+        print(f"✅ BATCH SECURED: {len(run_ids)} runs in {signature}")
+        if self.on_commit:
+            self.on_commit(run_ids, signature)
+        return signature
+
+    def _backoff(self, run_ids):
+        with self._lock:
+            for run_id in run_ids:
+                attempts = self._db.execute('SELECT attempts FROM outbox WHERE run_id = ?', (run_id,)).fetchone()[0] + 1
+                delay = min(self.base_backoff * 2 ** (attempts - 1), self.max_backoff) * random.uniform(0.8, 1.2)
+                self._db.execute('UPDATE outbox SET attempts = ?, next_attempt = ? WHERE run_id = ?',
+                                 (attempts, time.time() + delay, run_id))
+
+
+def build_payload(rows):
+    """Memo for a batch of outbox rows: PROTOCOL:ROOT:SUMMARY_JSON"""
+    tree = MerkleTree(b''.join(bytes.fromhex(r[1]) for r in rows))
+    if len(rows) == 1:
+        # Single run: same format batch_upload has always written
+        return f"OLYMPIC_L2:{rows[0][1]}:{rows[0][2]}", tree
+    runs = [[r[0], json.loads(r[2]).get('final_score', 0)] for r in rows]
+    return f"OLYMPIC_L2B:{tree.root_hex}:{json.dumps({'runs': runs}, separators=(',', ':'))}", tree
+
+
+class FakeMemoSender:
+    """Local stand-in for the RPC: records memos and fails on demand"""
+
+    def __init__(self, fail_rate=0.0, latency=0.0, seed=None):
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.sent = []
+        self._random = random.Random(seed)
+
+    def __call__(self, payload):
+        time.sleep(self.latency)
+        if self._random.random() < self.fail_rate:
+            raise ConnectionError("fake RPC unavailable")
+        self.sent.append(payload)
+        return 'fake' + hashlib.sha256(payload.encode('utf-8')).hexdigest()[:60]
@@ -1,24 +1,72 @@
 import streamlit as st
 import json
-import time
+import os
 import pandas as pd
 import plotly.express as px
+from statebus import StateSubscriber
+from burst import load_burst
+from archive import has_stream
+from downsample import lttb, run_pyramid
+
+CHART_POINTS = 1000  # Points sent to the browser per chart, however long the run
+REFRESH_SECONDS = 2  # How often the live status fragment checks for a new frame
+SNAPSHOT_FILE = "race_state.json"
 
 st.set_page_config(page_title="Biathlon Prediction Market", layout="wide")
 
 # --- LOAD STATE ---
-def load_state():
+@st.cache_resource
+def get_state_bus():
+    # One subscriber per server process, shared by every viewer session
+    return StateSubscriber()
+
+@st.cache_data(max_entries=1)
+def load_snapshot(mtime):
+    # Keyed by the file's mtime, so it's parsed once per write, not once per viewer refresh
     try:
-        with open("race_state.json", "r") as f:
+        with open(SNAPSHOT_FILE, "r") as f:
             return json.load(f)
     except:
         return {"status": "DISCONNECTED", "logs": []}
 
+def load_state():
+    # Latest frame pushed by bridge.py; fall back to the snapshot file
+    frame = get_state_bus().get()
+    if frame is not None:
+        return frame
+    try:
+        mtime = os.path.getmtime(SNAPSHOT_FILE)
+    except OSError:
+        mtime = None
+    return load_snapshot(mtime)
+
+@st.cache_data(max_entries=8)
+def load_events(burst_file):
+    # Columnar events saved by the bridge (burst.LOG_EVENT_DTYPE); a burst file never changes
+    events = load_burst(burst_file)
+    return pd.DataFrame({name: events[name] for name in events.dtype.names})
+
+def page_key(state):
+    # Everything below the header depends only on these; the page is rebuilt when one changes
+    offline = state['status'] in ("DISCONNECTED", "RUNNING_OFFLINE")
+    return (offline, state['status'] if not offline else None, state.get("run_id"),
+            state.get("burst_file"), len(state.get("logs", [])), state.get("tx_signature"))
+
 state = load_state()
+st.session_state.page_key = page_key(state)
 
 # --- HEADER ---
 st.title("🤖 UTRA Biathlon: The Prediction Market")
-st.markdown("### Status: " + f"**{state['status']}**")
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def live_status():
+    # Only this fragment reruns on the timer; a full rerun happens only when the page content would change
+    live = load_state()
+    if page_key(live) != st.session_state.page_key:
+        st.rerun()
+    st.markdown("### Status: " + f"**{live['status']}**")
+
+live_status()
 
 # --- PHASE 1: THE BETTING FLOOR (Offline) ---
 if state['status'] == "DISCONNECTED" or state['status'] == "RUNNING_OFFLINE":
@@ -45,15 +93,31 @@ elif state['status'] == "SYNCED":
     st.success("DATA BURST RECEIVED! VERIFYING ON SOLANA...")
     
     # Process the Logs
-    logs = state['logs'] # List of {timestamp, type, value}
-    df = pd.DataFrame(logs)
+    if "burst_file" in state:
+        df = load_events(state["burst_file"])
+        logs = df.to_dict("records")
+    else:
+        logs = state.get('logs', []) # List of {timestamp, type, value}
+        df = pd.DataFrame(logs)
     
     # 1. The "Lie Detector" Graph
     # Plot sensor values over time to prove the robot actually ran
     if not df.empty:
-        fig = px.line(df, x="timestamp", y="value", title="Robot Telemetry Replay")
+        chart = df.iloc[lttb(df["timestamp"], df["value"], CHART_POINTS)]
+        fig = px.line(chart, x="timestamp", y="value", title="Robot Telemetry Replay")
         st.plotly_chart(fig, use_container_width=True)
 
+    # Every LOG line of the run, from the bridge's telemetry archive
+    run_id = state.get("run_id")
+    if run_id and has_stream(run_id):
+        # Cached min/max pyramid: only rebuilt when the archive has grown
+        pyramid = run_pyramid(run_id, key="dist")
+        if pyramid is not None:
+            t, columns = pyramid.query(n_out=CHART_POINTS)
+            telemetry = pd.DataFrame({"t": t, **columns})
+            fig = px.line(telemetry, x="t", y=["left", "right", "dist"], title="Run Telemetry")
+            st.plotly_chart(fig, use_container_width=True)
+
     # 2. Event Timeline
     st.subheader("Race Replay")
     for log in logs:
@@ -69,7 +133,3 @@ elif state['status'] == "SYNCED":
     if "tx_signature" in state:
         st.markdown("---")
         st.markdown(f"**⛓️ Blockchain Proof:** [`{state['tx_signature']}`](https://explorer.solana.com/tx/{state['tx_signature']}?cluster=custom)")
-
-# --- AUTO REFRESH ---
-time.sleep(2)
-st.rerun()
\ No newline at end of file
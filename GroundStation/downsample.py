@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import archive
+
+# Reduce a series to a target point count before plotting or sending it.
+# Both methods return indices into the input, so x and every column stay aligned.
+DEFAULT_POINTS = 1000
+PYRAMID_FACTOR = 4      # Each pyramid level has ~1/4 of the points of the one below
+PYRAMID_OVERSAMPLE = 4  # Query a level with at most points * this many samples in range
+PYRAMID_CACHE_SIZE = 16
+
+
+def minmax(y, n_out):
+    """Indices of the min and max of each of n_out // 2 equal-count buckets (keeps spikes)"""
+    y = np.asarray(y)
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    buckets = max(n_out // 2, 1)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)[:-1]
+    bucket_of = np.repeat(np.arange(buckets), np.diff(np.append(edges, n)))
+    lo = np.minimum.reduceat(y, edges)
+    hi = np.maximum.reduceat(y, edges)
+    # First position in each bucket that hits the bucket's min / max
+    first_lo = np.unique(bucket_of[y == lo[bucket_of]], return_index=True)[1]
+    first_hi = np.unique(bucket_of[y == hi[bucket_of]], return_index=True)[1]
+    idx_lo = np.flatnonzero(y == lo[bucket_of])[first_lo]
+    idx_hi = np.flatnonzero(y == hi[bucket_of])[first_hi]
+    return np.unique(np.concatenate([idx_lo, idx_hi, [0, n - 1]]))
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: indices of n_out visually representative points"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    # Interior buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Averages of every bucket up front (the "next bucket" term of each step)
+    avg_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / np.diff(edges)
+    avg_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / np.diff(edges)
+    avg_x = np.append(avg_x, x[-1])
+    avg_y = np.append(avg_y, y[-1])
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        bx, by = x[lo:hi], y[lo:hi]
+        # Twice the triangle area (a, candidate, next bucket average), vectorized over the bucket
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+METHODS = {
+    'lttb': lambda x, y, n: lttb(x, y, n),
+    'minmax': lambda x, y, n: minmax(y, n),
+}
+
+
+def downsample(x, columns, n_out=DEFAULT_POINTS, method='lttb', key=None):
+    """
+    Reduce x and a dict of aligned columns to about n_out points.
+    The points are chosen on columns[key] (the first column by default).
+    """
+    key = key or next(iter(columns))
+    idx = METHODS[method](x, columns[key], n_out)
+    return x[idx], {name: values[idx] for name, values in columns.items()}
+
+
+class Pyramid:
+    """
+    Min/max pyramid over one run's series: level 0 is the raw data, each level
+    above keeps the extremes of PYRAMID_FACTOR-point buckets. A query picks the
+    coarsest level that still has enough points in range, so zooming never
+    rescans the raw series.
+    """
+
+    def __init__(self, x, columns, key=None):
+        self.key = key or next(iter(columns))
+        if self.key not in columns:
+            raise KeyError(self.key)
+        self.levels = [(np.asarray(x), {k: np.asarray(v) for k, v in columns.items()})]
+        while len(self.levels[-1][0]) > DEFAULT_POINTS * PYRAMID_OVERSAMPLE:
+            lx, lcols = self.levels[-1]
+            idx = minmax(lcols[self.key], len(lx) // PYRAMID_FACTOR)
+            self.levels.append((lx[idx], {k: v[idx] for k, v in lcols.items()}))
+
+    def query(self, start=None, end=None, n_out=DEFAULT_POINTS, method='lttb'):
+        for lx, lcols in reversed(self.levels):
+            lo = 0 if start is None else np.searchsorted(lx, start, 'left')
+            hi = len(lx) if end is None else np.searchsorted(lx, end, 'right')
+            if hi - lo >= n_out * PYRAMID_OVERSAMPLE or lx is self.levels[0][0]:
+                break
+        return downsample(lx[lo:hi], {k: v[lo:hi] for k, v in lcols.items()}, n_out, method, self.key)
+
+
+def load_columns(run_id, stream='telemetry'):
+    """A run's archived records as (t, {field: array})"""
+    records = [json.loads(line) for _, line in archive.iter_records(run_id, stream)]
+    if not records:
+        return np.empty(0, dtype=np.int64), {}
+    fields = [k for k in records[0] if k != 't']
+    t = np.fromiter((r['t'] for r in records), dtype=np.int64, count=len(records))
+    return t, {f: np.array([r.get(f, 0) for r in records], dtype=np.float64) for f in fields}
+
+
+_pyramids = OrderedDict()
+_pyramid_lock = threading.Lock()
+
+
+def _archive_version(run_id, stream):
+    # Segments only ever grow, so their sizes tell whether a cached pyramid is stale
+    path = archive.archive_path(run_id)
+    return tuple(os.path.getsize(base + '.ndjson') for base in archive._segments(path, stream)) if path else ()
+
+
+def run_pyramid(run_id, stream='telemetry', key=None):
+    """Cached Pyramid for a run's archive, rebuilt only when the archive has grown"""
+    cache_key = (run_id, stream, key)
+    version = _archive_version(run_id, stream)
+    with _pyramid_lock:
+        entry = _pyramids.get(cache_key)
+        if entry is not None and entry[0] == version:
+            _pyramids.move_to_end(cache_key)
+            return entry[1]
+    t, columns = load_columns(run_id, stream)
+    pyramid = Pyramid(t, columns, key) if columns else None
+    with _pyramid_lock:
+        _pyramids[cache_key] = (version, pyramid)
+        while len(_pyramids) > PYRAMID_CACHE_SIZE:
+            _pyramids.popitem(last=False)
+    return pyramid
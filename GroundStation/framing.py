@@ -0,0 +1,93 @@
+import binascii
+import logging
+import struct
+import numpy as np
+from burst import LOG_EVENT_DTYPE
+
+# Binary serial framing, mirrors BiathlonRobot/BinaryFrame.h:
+#   COBS( TYPE | PAYLOAD | CRC16 ) 0x00
+# CRC-16/CCITT-FALSE over TYPE + PAYLOAD, stored little-endian.
+FRAME_TELEMETRY = ord('T')
+FRAME_RECORD = ord('R')
+FRAME_BURST = ord('B')
+FRAME_BURST_END = ord('E')
+
+TELEMETRY = struct.Struct('<Iiih')
+RECORD = struct.Struct('<hI')
+BURST_END = struct.Struct('<H')
+MAX_BURST_EVENTS = 500  # MAX_LOGS in BiathlonRobot/DataLogger.h
+
+logger = logging.getLogger(__name__)
+
+
+class FrameError(ValueError):
+    """Raised for frames that fail COBS decoding, the CRC check or the layout"""
+
+
+def crc16(data):
+    # binascii.crc_hqx is poly 0x1021; with init 0xFFFF it's CCITT-FALSE, in C
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def cobs_decode(data):
+    out = bytearray()
+    i, n = 0, len(data)
+    while i < n:
+        code = data[i]
+        if code == 0 or i + code > n:
+            raise FrameError("bad COBS block")
+        out += data[i + 1:i + code]
+        i += code
+        if code < 0xFF and i < n:
+            out.append(0)
+    return bytes(out)
+
+
+class BinaryDecoder:
+    """Turns raw (still COBS-encoded) frames into the same tuples parse_line produces"""
+
+    def __init__(self):
+        self._burst = bytearray()
+
+    def decode(self, raw):
+        if not raw:
+            return None
+        body = cobs_decode(raw)
+        if len(body) < 3:
+            raise FrameError("short frame")
+        if crc16(body[:-2]) != int.from_bytes(body[-2:], 'little'):
+            raise FrameError("CRC mismatch")
+
+        kind, payload = body[0], body[1:-2]
+        try:
+            if kind in (FRAME_TELEMETRY, FRAME_RECORD) and self._burst:
+                # A new run's frames: the last burst's END frame was lost
+                self._drop_burst("run frames arrived before its end frame")
+            if kind == FRAME_TELEMETRY:
+                return ('LOG', *TELEMETRY.unpack(payload))
+            if kind == FRAME_RECORD:
+                return ('RECORD', *RECORD.unpack(payload))
+            if kind == FRAME_BURST:
+                if len(payload) % LOG_EVENT_DTYPE.itemsize:
+                    raise FrameError("partial LogEvent in burst frame")
+                if len(self._burst) + len(payload) > MAX_BURST_EVENTS * LOG_EVENT_DTYPE.itemsize:
+                    self._drop_burst(f"more than {MAX_BURST_EVENTS} events")
+                    raise FrameError("burst too long")
+                self._burst += payload
+                return None
+            if kind == FRAME_BURST_END:
+                expected, = BURST_END.unpack(payload)
+                events = np.frombuffer(bytes(self._burst), dtype=LOG_EVENT_DTYPE)
+                self._burst = bytearray()
+                if len(events) != expected:
+                    # A lost burst frame, or an earlier burst's lost end frame: not this run's burst as sent
+                    logger.warning("Dropped an incomplete burst: %d/%d events", len(events), expected)
+                    raise FrameError("incomplete burst")
+                return ('BURST', events)
+        except struct.error as e:
+            raise FrameError(str(e))
+        raise FrameError(f"unknown frame type {kind}")
+
+    def _drop_burst(self, reason):
+        logger.warning("Dropped a partial burst (%d bytes): %s", len(self._burst), reason)
+        self._burst = bytearray()
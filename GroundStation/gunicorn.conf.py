@@ -0,0 +1,8 @@
+import multiprocessing
+import os
+
+bind = os.environ.get('OLYMPIMARKET_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = 16           # /api/stream holds one per open stream, at most MAX_STREAMS (12 in app.py) of them
+preload_app = False    # Each worker builds its own ledger connection and background threads
@@ -0,0 +1,210 @@
+import logging
+import queue
+import threading
+import time
+from burst import decode_burst
+from framing import BinaryDecoder, FrameError
+
+# Frames handed to the consumer:
+#   ('LOG', time_ms, left_ticks, right_ticks, dist_cm)
+#   ('RECORD', score, time_ms)
+#   ('BURST', events)   events is a burst.LOG_EVENT_DTYPE array
+LOG_PREFIX = b'LOG:'
+RECORD_PREFIX = b'SOLANA_RECORD:'
+BURST_BEGIN = b'---BEGIN_BURST---'
+BURST_END = b'---END_BURST---'
+MAX_BURST_BYTES = 256 * 1024  # A full robot log (MAX_LOGS = 500 events) is about 12 KB
+
+logger = logging.getLogger(__name__)
+
+
+def parse_line(line):
+    """Parse one ASCII serial line into a frame tuple (None for lines we ignore)"""
+    if line.startswith(LOG_PREFIX):
+        # LOG:TIME,L,R,DIST,   (trailing fields are optional)
+        fields = line[len(LOG_PREFIX):].split(b',')
+        values = [int(f) for f in fields[:4] if f]
+        values += [0] * (4 - len(values))
+        return ('LOG', *values)
+    if line.startswith(RECORD_PREFIX):
+        # SOLANA_RECORD:SCORE:TIME
+        score, time_ms = line[len(RECORD_PREFIX):].split(b':')
+        return ('RECORD', int(score), int(time_ms))
+    return None
+
+
+class LineSplitter:
+    """Splits a byte stream into lines (or 0x00-delimited frames) using one reusable buffer"""
+
+    def __init__(self, delimiter=b'\n', max_line=1024):
+        self.delimiter = delimiter
+        self.max_line = max_line
+        self.overflows = 0
+        self._buf = bytearray()
+
+    def feed(self, chunk):
+        """Every complete line in the buffer plus `chunk`; the remainder is kept for the next chunk"""
+        buf = self._buf
+        buf += chunk
+        lines = []
+        start = 0
+        while True:
+            end = buf.find(self.delimiter, start)
+            if end < 0:
+                break
+            stop = end
+            if self.delimiter == b'\n' and end > start and buf[end - 1] == 0x0D:
+                stop -= 1  # strip \r
+            lines.append(bytes(buf[start:stop]))
+            start = end + 1
+        # Trimmed before the caller sees any line, so an exception while handling one can't replay them
+        del buf[:start]
+        if len(buf) > self.max_line:
+            # No newline in sight: garbage or a baud mismatch, resync on the next one
+            self.overflows += 1
+            del buf[:]
+        return lines
+
+
+class SerialIngest:
+    """
+    Reader thread that pulls bulk chunks off the serial port, splits and parses
+    them, and hands frames to the consumer through a bounded queue. When the
+    consumer falls behind, new frames are dropped and counted rather than
+    letting the OS serial buffer overflow.
+
+    Several ingests can share one `frames` queue; with a `tag` each frame is
+    queued as (tag, frame) so the consumer knows which port it came from.
+    """
+
+    def __init__(self, ser, maxsize=4096, chunk_size=4096, protocol='ascii', frames=None, tag=None):
+        self.ser = ser
+        self.chunk_size = chunk_size
+        self.protocol = protocol
+        self.tag = tag
+        self.frames = frames if frames is not None else queue.Queue(maxsize)
+        if protocol == 'binary':
+            self.splitter = LineSplitter(delimiter=b'\x00')
+            self.decoder = BinaryDecoder()
+        else:
+            self.splitter = LineSplitter()
+        self.stats = {'bytes': 0, 'frames': 0, 'dropped': 0, 'bad': 0, 'bursts': 0, 'aborted_bursts': 0}
+        self._burst = None  # raw burst body while between the markers
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='serial-ingest', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Ask the reader thread to exit, waiting up to `timeout` for it"""
+        self._stop.set()
+        if timeout is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                # Blocks until at least one byte (or the port timeout), then takes everything buffered
+                chunk = self.ser.read(min(max(self.ser.in_waiting, 1), self.chunk_size))
+            except Exception as e:
+                logger.warning("Serial read error: %s", e)
+                time.sleep(1)
+                continue
+            if chunk:
+                try:
+                    self.feed(chunk)
+                except Exception:
+                    # A bad chunk must not take the reader thread down with it
+                    self.stats['bad'] += 1
+                    self._burst = None
+                    logger.exception("Serial ingest failed on a %d-byte chunk", len(chunk))
+
+    def feed(self, chunk):
+        """Split and parse a chunk of raw serial bytes"""
+        self.stats['bytes'] += len(chunk)
+        if self.protocol == 'binary':
+            self._feed_binary(chunk)
+        else:
+            self._feed_ascii(chunk)
+
+    def _feed_binary(self, chunk):
+        for raw in self.splitter.feed(chunk):
+            try:
+                frame = self.decoder.decode(raw)
+            except FrameError:
+                self.stats['bad'] += 1
+                continue
+            if frame is not None:
+                if frame[0] == 'BURST':
+                    self.stats['bursts'] += 1
+                self.put(frame, block=frame[0] == 'BURST')
+
+    def _abort_burst(self, reason):
+        self._burst = None
+        self.stats['aborted_bursts'] += 1
+        logger.warning("Dropped a partial burst: %s", reason)
+
+    def _feed_ascii(self, chunk):
+        for line in self.splitter.feed(chunk):
+            if self._burst is not None:
+                if line == BURST_END:
+                    events = decode_burst(bytes(self._burst))
+                    self._burst = None
+                    self.stats['bursts'] += 1
+                    self.put(('BURST', events), block=True)
+                    continue
+                if line == BURST_BEGIN:
+                    # The robot restarted its dump: keep only the new one
+                    self._abort_burst("new burst started before END_BURST")
+                elif line.startswith(LOG_PREFIX) or line.startswith(RECORD_PREFIX):
+                    # Telemetry again means the robot reset mid-burst; parse the line normally below
+                    self._abort_burst("telemetry resumed before END_BURST")
+                elif len(self._burst) + len(line) >= MAX_BURST_BYTES:
+                    self._abort_burst(f"no END_BURST within {MAX_BURST_BYTES} bytes")
+                    continue
+                else:
+                    self._burst += line
+                    self._burst += b'\n'
+                    continue
+            if line == BURST_BEGIN:
+                self._burst = bytearray()
+                continue
+            try:
+                frame = parse_line(line)
+            except (ValueError, IndexError):
+                self.stats['bad'] += 1
+                continue
+            if frame is not None:
+                self.put(frame)
+
+    def put(self, frame, block=False):
+        # Telemetry can be dropped under pressure, a whole run's burst can't
+        if self.tag is not None:
+            frame = (self.tag, frame)
+        try:
+            self.frames.put(frame, block=block)
+            self.stats['frames'] += 1
+        except queue.Full:
+            self.stats['dropped'] += 1
+
+    def drain(self, timeout):
+        """Wait up to `timeout` for a frame, then return everything queued"""
+        return drain(self.frames, timeout)
+
+    def snapshot(self):
+        return dict(self.stats, backlog=self.frames.qsize(), overflows=self.splitter.overflows)
+
+
+def drain(frames, timeout):
+    """Wait up to `timeout` for an item on a queue, then return everything queued"""
+    try:
+        batch = [frames.get(timeout=timeout)]
+    except queue.Empty:
+        return []
+    while True:
+        try:
+            batch.append(frames.get_nowait())
+        except queue.Empty:
+            return batch
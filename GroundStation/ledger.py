@@ -0,0 +1,702 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+STARTING_BALANCE = 1000
+
+# Per-(race, user) stake totals from the positions table; *_stake are pari-mutuel stakes (no shares)
+PARTICIPANTS_REBUILD = '''INSERT INTO market_participants (race_id, user_id, positions, amount, success_stake,
+                                                         fail_stake, success_shares, fail_shares)
+                         SELECT race_id, user_id,
+                                COUNT(CASE WHEN status = 'OPEN' THEN 1 END),
+                                TOTAL(CASE WHEN status = 'OPEN' THEN amount END),
+                                TOTAL(CASE WHEN status = 'OPEN' AND shares IS NULL AND position = 'SUCCESS' THEN amount END),
+                                TOTAL(CASE WHEN status = 'OPEN' AND shares IS NULL AND position = 'FAIL' THEN amount END),
+                                TOTAL(CASE WHEN status = 'OPEN' AND position = 'SUCCESS' THEN shares END),
+                                TOTAL(CASE WHEN status = 'OPEN' AND position = 'FAIL' THEN shares END)
+                         FROM positions GROUP BY race_id, user_id'''
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = [
+    [
+        '''CREATE TABLE users (
+            user_id TEXT PRIMARY KEY,
+            balance REAL NOT NULL
+        )''',
+        '''CREATE TABLE positions (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL REFERENCES users(user_id),
+            position TEXT NOT NULL,
+            amount REAL NOT NULL,
+            timestamp TEXT NOT NULL,
+            status TEXT NOT NULL
+        )''',
+        'CREATE INDEX idx_positions_user ON positions(user_id, position)',
+        'CREATE INDEX idx_positions_position ON positions(position)',
+    ],
+    [
+        'ALTER TABLE positions ADD COLUMN race_id INTEGER NOT NULL DEFAULT 0',
+        'CREATE INDEX idx_positions_race ON positions(race_id, status)',
+        '''CREATE TABLE markets (
+            race_id INTEGER NOT NULL PRIMARY KEY,
+            success_volume REAL NOT NULL DEFAULT 0,
+            fail_volume REAL NOT NULL DEFAULT 0,
+            participants INTEGER NOT NULL DEFAULT 0,
+            open_interest REAL NOT NULL DEFAULT 0
+        )''',
+        '''CREATE TABLE market_participants (
+            race_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            PRIMARY KEY (race_id, user_id)
+        ) WITHOUT ROWID''',
+    ],
+    [
+        'ALTER TABLE positions ADD COLUMN payout REAL',
+        # Positions are looked up by race alone, so status needn't be in the index
+        'DROP INDEX idx_positions_race',
+        'CREATE INDEX idx_positions_race ON positions(race_id)',
+        '''CREATE TABLE settlements (
+            race_id INTEGER NOT NULL PRIMARY KEY,
+            outcome TEXT NOT NULL,
+            final_time REAL NOT NULL,
+            final_score INTEGER NOT NULL,
+            positions INTEGER NOT NULL,
+            pool REAL NOT NULL,
+            payout_ratio REAL NOT NULL,
+            refunded INTEGER NOT NULL,
+            settled_at TEXT NOT NULL
+        )''',
+    ],
+    [
+        # Keyset pagination of a user's history, newest first
+        'CREATE INDEX idx_positions_user_time ON positions(user_id, timestamp, id)',
+    ],
+    [
+        # LMSR shares bought by a position (NULL for older pari-mutuel stakes) and each race's share vector
+        'ALTER TABLE positions ADD COLUMN shares REAL',
+        'ALTER TABLE markets ADD COLUMN success_shares REAL NOT NULL DEFAULT 0',
+        'ALTER TABLE markets ADD COLUMN fail_shares REAL NOT NULL DEFAULT 0',
+    ],
+    [
+        # Client idempotency key of the request that placed a position, so a retried bet isn't debited twice
+        'ALTER TABLE positions ADD COLUMN request_key TEXT',
+        'CREATE UNIQUE INDEX idx_positions_request ON positions(user_id, request_key) WHERE request_key IS NOT NULL',
+    ],
+    [
+        # Each bettor's OPEN stakes per race, kept up to date by every bet like the markets row,
+        # so settlement reads one row per bettor instead of every position
+        'ALTER TABLE market_participants ADD COLUMN positions INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE market_participants ADD COLUMN amount REAL NOT NULL DEFAULT 0',
+        'ALTER TABLE market_participants ADD COLUMN success_stake REAL NOT NULL DEFAULT 0',
+        'ALTER TABLE market_participants ADD COLUMN fail_stake REAL NOT NULL DEFAULT 0',
+        'ALTER TABLE market_participants ADD COLUMN success_shares REAL NOT NULL DEFAULT 0',
+        'ALTER TABLE market_participants ADD COLUMN fail_shares REAL NOT NULL DEFAULT 0',
+        'DELETE FROM market_participants',
+        PARTICIPANTS_REBUILD,
+    ],
+]
+
+POSITIONS = ('SUCCESS', 'FAIL')
+UNASSIGNED_RACE = 0  # race_id of positions placed before markets were keyed by race
+MAX_QUERY_PARAMS = 500  # Keep IN (...) lists well under SQLite's bound-parameter limit
+
+# Settling a race writes one settlements row, not every position: a position still stored as OPEN
+# takes its status and payout from its race's settlement when read (see settled_position)
+POSITION_SELECT = '''SELECT p.*, s.outcome AS settled_outcome, s.payout_ratio AS settled_ratio,
+                           s.refunded AS settled_refunded
+                    FROM positions p LEFT JOIN settlements s ON s.race_id = p.race_id AND p.status = 'OPEN' '''
+
+
+class InsufficientBalance(Exception):
+    """Raised when a user tries to bet more than their balance"""
+
+
+class MarketClosed(Exception):
+    """Raised when betting on a race that has already been settled"""
+
+
+def new_position(position, amount, race_id=UNASSIGNED_RACE, shares=None):
+    """Build a fresh OPEN position record"""
+    return {
+        'id': str(uuid.uuid4()),
+        'race_id': race_id,
+        'position': position,
+        'amount': amount,
+        'shares': shares,
+        'timestamp': datetime.now().isoformat(),
+        'status': 'OPEN'
+    }
+
+
+def settled_position(position, amount, shares, outcome, ratio, refunded):
+    """(status, payout) of an OPEN position once its race has settled"""
+    if shares is None and refunded:
+        return 'REFUNDED', amount
+    if position != outcome:
+        return 'LOST', 0
+    # LMSR shares pay 1 each; pari-mutuel stakes get the pool's payout ratio
+    return 'WON', shares if shares is not None else amount * ratio
+
+
+def single_result(results):
+    """Unwrap the one-order result of place_bets(): (balance, record) or raise"""
+    result, = results
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def empty_market():
+    return {'success_volume': 0, 'fail_volume': 0, 'participants': 0, 'open_interest': 0,
+            'success_shares': 0, 'fail_shares': 0}
+
+
+class JsonLedger:
+    """Original whole-file bets.json store (O(total bets) per write)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.settlements_path = os.path.splitext(path)[0] + '.settlements.json'  # {race_id: settlement}
+        self._lock = threading.Lock()
+        self._markets = None
+        self._participants = None
+
+    def load_all(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except:
+            return {}
+
+    def save_all(self, bets_data):
+        with open(self.path, 'w') as f:
+            json.dump(bets_data, f, indent=2)
+        self._markets = None
+
+    def get_user(self, user_id):
+        return self.load_all().get(user_id, {'balance': STARTING_BALANCE, 'positions': []})
+
+    def balance(self, user_id):
+        return self.get_user(user_id)['balance']
+
+    def positions_page(self, user_id, limit, before=None):
+        positions = sorted(self.get_user(user_id)['positions'], key=lambda p: (p['timestamp'], p['id']), reverse=True)
+        if before is not None:
+            positions = [p for p in positions if (p['timestamp'], p['id']) < tuple(before)]
+        return positions[:limit]
+
+    def user_count(self):
+        return len(self.load_all())
+
+    def place_bet(self, user_id, position, amount, race_id=UNASSIGNED_RACE, fill_fn=None, request_key=None):
+        return single_result(self.place_bets([{'user_id': user_id, 'position': position, 'amount': amount,
+                                               'race_id': race_id, 'request_key': request_key}], fill_fn))
+
+    def place_bets(self, orders, fill_fn=None):
+        """Apply a batch of place_bet() orders with one file write; see SqliteLedger.place_bets"""
+        with self._lock:
+            bets = self.load_all()
+            if self._markets is None:
+                self._rebuild_markets()
+            markets, participants = self._markets, self._participants
+            results = []
+            for order in orders:
+                try:
+                    results.append(self._place_bet(bets, fill_fn, **order))
+                except InsufficientBalance as e:
+                    results.append(e)
+            if all(isinstance(r, Exception) for r in results):
+                return results
+            try:
+                self.save_all(bets)
+            except:
+                self._markets = None
+                raise
+            self._markets, self._participants = markets, participants
+            return results
+
+    def _place_bet(self, bets, fill_fn, user_id, position, amount, race_id=UNASSIGNED_RACE, request_key=None):
+        user_bets = bets.setdefault(user_id, {'balance': STARTING_BALANCE, 'positions': []})
+        if request_key is not None and request_key in user_bets.get('requests', {}):
+            position_id = user_bets['requests'][request_key]
+            return user_bets['balance'], next(p for p in user_bets['positions'] if p['id'] == position_id)
+        if user_bets['balance'] < amount:
+            raise InsufficientBalance(user_id)
+
+        m = self._markets.setdefault(race_id, empty_market())
+        shares = None
+        if fill_fn is not None:
+            shares = fill_fn((m['success_shares'], m['fail_shares']), POSITIONS.index(position), amount)
+        record = new_position(position, amount, race_id, shares)
+        user_bets['balance'] -= amount
+        user_bets['positions'].append(record)
+        if request_key is not None:
+            user_bets.setdefault('requests', {})[request_key] = record['id']
+
+        m['success_volume' if position == 'SUCCESS' else 'fail_volume'] += amount
+        m['success_shares' if position == 'SUCCESS' else 'fail_shares'] += shares or 0
+        m['open_interest'] += amount
+        if (race_id, user_id) not in self._participants:
+            self._participants.add((race_id, user_id))
+            m['participants'] += 1
+        return user_bets['balance'], record
+
+    def market(self, race_id):
+        # Aggregates are rebuilt from the file once, then kept up to date by place_bet
+        with self._lock:
+            if self._markets is None:
+                self._rebuild_markets()
+            return dict(self._markets.get(race_id, empty_market()))
+
+    def markets(self, race_ids):
+        with self._lock:
+            if self._markets is None:
+                self._rebuild_markets()
+            return {r: dict(self._markets.get(r, empty_market())) for r in race_ids}
+
+    def live_races(self):
+        # Settling closes a race's positions, so a race is live while it still has open stakes
+        with self._lock:
+            if self._markets is None:
+                self._rebuild_markets()
+            return sorted(r for r, m in self._markets.items() if r != UNASSIGNED_RACE and m['open_interest'] > 0)
+
+    def rebuild_markets(self):
+        with self._lock:
+            self._rebuild_markets()
+            return len(self._markets)
+
+    def settle_race(self, race_id, outcome, final_time, final_score, payout_fn):
+        """Resolve every OPEN position of a race with one file write; see SqliteLedger.settle_race"""
+        with self._lock:
+            settlements = self._load_settlements()
+            if str(race_id) in settlements:
+                return dict(settlements[str(race_id)], replayed=True)
+
+            bets = self.load_all()
+            positions = [(user_bets, p) for user_bets in bets.values() for p in user_bets.get('positions', [])
+                         if p.get('race_id', UNASSIGNED_RACE) == race_id and p['status'] == 'OPEN']
+            stakes = [(p['position'], p['amount']) for _, p in positions if p.get('shares') is None]
+            if stakes:
+                ratio, refunded = payout_fn(sum(a for side, a in stakes if side == outcome), sum(a for _, a in stakes))
+            else:
+                ratio, refunded = 1.0, False
+            for user_bets, p in positions:
+                p['status'], p['payout'] = settled_position(p['position'], p['amount'], p.get('shares'),
+                                                            outcome, ratio, refunded)
+                user_bets['balance'] += p['payout']
+
+            result = {
+                'race_id': race_id,
+                'outcome': outcome,
+                'final_time': final_time,
+                'final_score': final_score,
+                'positions': len(positions),
+                'pool': sum(p['amount'] for _, p in positions),
+                'payout_ratio': float(ratio),
+                'refunded': bool(refunded),
+                'settled_at': datetime.now().isoformat()
+            }
+            # Positions first: a crash in between leaves nothing OPEN to pay twice
+            self.save_all(bets)
+            settlements[str(race_id)] = result
+            with open(self.settlements_path, 'w') as f:
+                json.dump(settlements, f, indent=2)
+        return dict(result, replayed=False)
+
+    def settlement(self, race_id):
+        return self._load_settlements().get(str(race_id))
+
+    def _load_settlements(self):
+        try:
+            with open(self.settlements_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _rebuild_markets(self):
+        markets, participants = {}, set()
+        for user_id, user_bets in self.load_all().items():
+            for p in user_bets.get('positions', []):
+                if p.get('position') not in POSITIONS:
+                    continue
+                race_id = p.get('race_id', UNASSIGNED_RACE)
+                m = markets.setdefault(race_id, empty_market())
+                m['success_volume' if p['position'] == 'SUCCESS' else 'fail_volume'] += p['amount']
+                m['success_shares' if p['position'] == 'SUCCESS' else 'fail_shares'] += p.get('shares') or 0
+                if p['status'] == 'OPEN':
+                    m['open_interest'] += p['amount']
+                if (race_id, user_id) not in participants:
+                    participants.add((race_id, user_id))
+                    m['participants'] += 1
+        self._markets, self._participants = markets, participants
+
+
+class SqliteLedger:
+    """SQLite (WAL) ledger: per-user rows and an indexed positions table"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._migrate()
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            # Every commit is fsynced; bets are group-committed (see betwriter.py) to share that cost
+            conn.execute('PRAGMA synchronous=FULL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self):
+        # Re-check the version under the write lock so concurrent workers migrate once
+        conn = self._conn()
+        for i, statements in enumerate(MIGRATIONS, start=1):
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if conn.execute('PRAGMA user_version').fetchone()[0] < i:
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f'PRAGMA user_version = {i}')
+                conn.execute('COMMIT')
+            except:
+                conn.execute('ROLLBACK')
+                raise
+
+    def load_all(self):
+        conn = self._conn()
+        bets = {row['user_id']: {'balance': row['balance'], 'positions': []}
+                for row in conn.execute('SELECT user_id, balance FROM users')}
+        for row in conn.execute(POSITION_SELECT + 'ORDER BY p.timestamp'):
+            bets[row['user_id']]['positions'].append(_position_dict(row))
+        return bets
+
+    def save_all(self, bets_data):
+        """Replace the whole ledger in one transaction (demo seeding / imports)"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM settlements')
+            conn.execute('DELETE FROM positions')
+            conn.execute('DELETE FROM users')
+            conn.executemany('INSERT INTO users (user_id, balance) VALUES (?, ?)',
+                             [(uid, u['balance']) for uid, u in bets_data.items()])
+            conn.executemany(
+                'INSERT INTO positions (id, user_id, race_id, position, amount, shares, timestamp, status, payout) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(p['id'], uid, p.get('race_id', UNASSIGNED_RACE), p['position'], p['amount'], p.get('shares'),
+                  p['timestamp'], p['status'], p.get('payout'))
+                 for uid, u in bets_data.items() for p in u.get('positions', [])])
+            self._rebuild_markets(conn)
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get_user(self, user_id):
+        conn = self._conn()
+        row = conn.execute('SELECT balance FROM users WHERE user_id = ?', (user_id,)).fetchone()
+        if row is None:
+            return {'balance': STARTING_BALANCE, 'positions': []}
+        positions = conn.execute(POSITION_SELECT + 'WHERE p.user_id = ? ORDER BY p.timestamp',
+                                 (user_id,)).fetchall()
+        return {'balance': row['balance'], 'positions': [_position_dict(p) for p in positions]}
+
+    def balance(self, user_id):
+        row = self._conn().execute('SELECT balance FROM users WHERE user_id = ?', (user_id,)).fetchone()
+        return STARTING_BALANCE if row is None else row['balance']
+
+    def positions_page(self, user_id, limit, before=None):
+        """Up to `limit` positions older than the (timestamp, id) key `before`, newest first"""
+        if before is None:
+            rows = self._conn().execute(POSITION_SELECT + '''WHERE p.user_id = ?
+                                           ORDER BY p.timestamp DESC, p.id DESC LIMIT ?''', (user_id, limit))
+        else:
+            rows = self._conn().execute(POSITION_SELECT + '''WHERE p.user_id = ? AND (p.timestamp, p.id) < (?, ?)
+                                           ORDER BY p.timestamp DESC, p.id DESC LIMIT ?''',
+                                        (user_id, before[0], before[1], limit))
+        return [_position_dict(r) for r in rows]
+
+    def user_count(self):
+        return self._conn().execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    def place_bet(self, user_id, position, amount, race_id=UNASSIGNED_RACE, fill_fn=None, request_key=None):
+        """
+        Debit the balance, insert the position and bump the market atomically.
+
+        fill_fn(share_vector, outcome_index, amount) prices the order against the
+        race's current (success, fail) shares and returns the shares bought; it
+        runs inside the write transaction, so concurrent bets fill one after the
+        other. Without it the position is a plain pari-mutuel stake.
+
+        A repeated request_key for the same user returns the position it already
+        placed (with the current balance) instead of betting again.
+        """
+        return single_result(self.place_bets([{'user_id': user_id, 'position': position, 'amount': amount,
+                                               'race_id': race_id, 'request_key': request_key}], fill_fn))
+
+    def place_bets(self, orders, fill_fn=None):
+        """
+        Apply a batch of orders (dicts of place_bet() arguments) in one transaction,
+        so the whole batch costs a single commit and fsync. Each order runs in its
+        own savepoint: one that fails (InsufficientBalance, MarketClosed) is rolled
+        back alone and its exception takes its place in the returned list, in
+        order, alongside (balance, record) for the rest.
+        """
+        conn = self._conn()
+        results = []
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for order in orders:
+                conn.execute('SAVEPOINT bet')
+                try:
+                    results.append(self._place_bet(conn, fill_fn, **order))
+                except (InsufficientBalance, MarketClosed) as e:
+                    conn.execute('ROLLBACK TO bet')
+                    results.append(e)
+                conn.execute('RELEASE bet')
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+        return results
+
+    def _place_bet(self, conn, fill_fn, user_id, position, amount, race_id=UNASSIGNED_RACE, request_key=None):
+        if request_key is not None:
+            row = conn.execute(POSITION_SELECT + 'WHERE p.user_id = ? AND p.request_key = ?',
+                               (user_id, request_key)).fetchone()
+            if row is not None:
+                return self.balance(user_id), _position_dict(row)
+        if conn.execute('SELECT 1 FROM settlements WHERE race_id = ?', (race_id,)).fetchone():
+            raise MarketClosed(race_id)
+        conn.execute('INSERT OR IGNORE INTO users (user_id, balance) VALUES (?, ?)',
+                     (user_id, STARTING_BALANCE))
+        cur = conn.execute('UPDATE users SET balance = balance - ? WHERE user_id = ? AND balance >= ?',
+                           (amount, user_id, amount))
+        if cur.rowcount == 0:
+            raise InsufficientBalance(user_id)
+        shares = None
+        if fill_fn is not None:
+            row = conn.execute('SELECT success_shares, fail_shares FROM markets WHERE race_id = ?',
+                               (race_id,)).fetchone()
+            shares = fill_fn(tuple(row) if row else (0.0, 0.0), POSITIONS.index(position), amount)
+        record = new_position(position, amount, race_id, shares)
+        conn.execute(
+            'INSERT INTO positions (id, user_id, race_id, position, amount, shares, timestamp, status, request_key) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (record['id'], user_id, race_id, position, amount, shares, record['timestamp'], record['status'],
+             request_key))
+        self._add_to_market(conn, race_id, user_id, position, amount, shares)
+        balance = conn.execute('SELECT balance FROM users WHERE user_id = ?', (user_id,)).fetchone()[0]
+        return balance, record
+
+    def _add_to_market(self, conn, race_id, user_id, position, amount, shares=None):
+        """Add a new position to its race's market row and its bettor's stake totals"""
+        new_participant = conn.execute('INSERT OR IGNORE INTO market_participants (race_id, user_id) VALUES (?, ?)',
+                                       (race_id, user_id)).rowcount
+        side = 'success' if position == 'SUCCESS' else 'fail'
+        stake = amount if shares is None else 0
+        conn.execute(f'UPDATE market_participants SET positions = positions + 1, amount = amount + ?, '
+                     f'{side}_stake = {side}_stake + ?, {side}_shares = {side}_shares + ? '
+                     'WHERE race_id = ? AND user_id = ?', (amount, stake, shares or 0, race_id, user_id))
+        conn.execute('INSERT OR IGNORE INTO markets (race_id) VALUES (?)', (race_id,))
+        conn.execute(f'UPDATE markets SET {side}_volume = {side}_volume + ?, {side}_shares = {side}_shares + ?, '
+                     'open_interest = open_interest + ?, participants = participants + ? WHERE race_id = ?',
+                     (amount, shares or 0, amount, new_participant, race_id))
+
+    def settle_race(self, race_id, outcome, final_time, final_score, payout_fn):
+        """
+        Resolve every OPEN position of a race in one transaction.
+
+        payout_fn(winning_stake, pool) gets the race's pari-mutuel totals and
+        returns (payout_ratio, refunded); payouts are linear in stake, so that
+        ratio prices every position. LMSR positions (those with shares) are paid 1
+        per winning share. Credits come from the per-bettor totals in
+        market_participants and are applied in SQL, and positions aren't
+        rewritten (see POSITION_SELECT), so the cost is one update per paid
+        bettor however many positions they hold.
+        Replaying an already settled race returns the stored result and changes nothing.
+        """
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            existing = conn.execute('SELECT * FROM settlements WHERE race_id = ?', (race_id,)).fetchone()
+            if existing is not None:
+                conn.execute('COMMIT')
+                return dict(_settlement_dict(existing), replayed=True)
+
+            # Bettors' stake totals are maintained on every bet, so this reads one row per bettor
+            side = 'success' if outcome == 'SUCCESS' else 'fail'
+            count, pool, stakes, winning_stakes = conn.execute(
+                f'''SELECT TOTAL(positions), TOTAL(amount), TOTAL(success_stake + fail_stake), TOTAL({side}_stake)
+                    FROM market_participants WHERE race_id = ?''', (race_id,)).fetchone()
+            if stakes > 0:
+                ratio, refunded = payout_fn(winning_stakes, stakes)
+            else:
+                ratio, refunded = 1.0, False
+
+            # Credit every paid bettor in one set-based statement
+            credit = f'''{side}_shares + CASE WHEN :refunded THEN success_stake + fail_stake
+                                               ELSE {side}_stake * :ratio END'''
+            conn.execute(f'''UPDATE users SET balance = balance + (
+                                 SELECT {credit} FROM market_participants m
+                                 WHERE m.race_id = :race_id AND m.user_id = users.user_id)
+                             WHERE user_id IN (SELECT user_id FROM market_participants
+                                               WHERE race_id = :race_id AND {credit} > 0)''',
+                         {'race_id': race_id, 'ratio': float(ratio), 'refunded': int(refunded)})
+            conn.execute('UPDATE markets SET open_interest = 0 WHERE race_id = ?', (race_id,))
+
+            result = {
+                'race_id': race_id,
+                'outcome': outcome,
+                'final_time': final_time,
+                'final_score': final_score,
+                'positions': int(count),
+                'pool': pool,
+                'payout_ratio': float(ratio),
+                'refunded': bool(refunded),
+                'settled_at': datetime.now().isoformat()
+            }
+            conn.execute('INSERT INTO settlements (race_id, outcome, final_time, final_score, positions, pool, '
+                         'payout_ratio, refunded, settled_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         (race_id, outcome, final_time, final_score, result['positions'], result['pool'],
+                          result['payout_ratio'], int(refunded), result['settled_at']))
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+        return dict(result, replayed=False)
+
+    def settlement(self, race_id):
+        row = self._conn().execute('SELECT * FROM settlements WHERE race_id = ?', (race_id,)).fetchone()
+        return _settlement_dict(row) if row else None
+
+    def market(self, race_id):
+        """Current aggregate for one race (a single primary-key lookup)"""
+        row = self._conn().execute('SELECT * FROM markets WHERE race_id = ?', (race_id,)).fetchone()
+        if row is None:
+            return empty_market()
+        return _market_dict(row)
+
+    def markets(self, race_ids):
+        """Aggregates for several races in one indexed query: {race_id: market}"""
+        race_ids = list(race_ids)
+        result = {r: empty_market() for r in race_ids}
+        conn = self._conn()
+        for i in range(0, len(race_ids), MAX_QUERY_PARAMS):
+            chunk = race_ids[i:i + MAX_QUERY_PARAMS]
+            rows = conn.execute(f'SELECT * FROM markets WHERE race_id IN ({",".join("?" * len(chunk))})', chunk)
+            result.update((row['race_id'], _market_dict(row)) for row in rows)
+        return result
+
+    def open_market(self, race_id):
+        """Create a race's market row, so it is live (and priced) before its first bet"""
+        self._conn().execute('INSERT OR IGNORE INTO markets (race_id) VALUES (?)', (race_id,))
+
+    def open_race(self, after=UNASSIGNED_RACE):
+        """Allocate a race id above `after` and every race in the ledger, and open its market"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            race_id = conn.execute('''SELECT MAX(?, COALESCE((SELECT MAX(race_id) FROM markets), 0),
+                                                 COALESCE((SELECT MAX(race_id) FROM settlements), 0)) + 1''',
+                                   (after,)).fetchone()[0]
+            conn.execute('INSERT INTO markets (race_id) VALUES (?)', (race_id,))
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+        return race_id
+
+    def live_races(self):
+        """Open races (with bets, or opened by the bridge) that haven't been settled yet"""
+        rows = self._conn().execute('''SELECT race_id FROM markets
+                                       WHERE race_id != ? AND race_id NOT IN (SELECT race_id FROM settlements)
+                                       ORDER BY race_id''', (UNASSIGNED_RACE,))
+        return [row[0] for row in rows]
+
+    def rebuild_markets(self):
+        """Recompute every market aggregate from the positions table (recovery)"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._rebuild_markets(conn)
+            count = conn.execute('SELECT COUNT(*) FROM markets').fetchone()[0]
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+        return count
+
+    def _rebuild_markets(self, conn):
+        conn.execute('DELETE FROM markets')
+        conn.execute('DELETE FROM market_participants')
+        conn.execute(PARTICIPANTS_REBUILD)
+        conn.execute('''INSERT INTO markets (race_id, success_volume, fail_volume, participants, open_interest,
+                                             success_shares, fail_shares)
+                        SELECT race_id,
+                               TOTAL(CASE WHEN position = 'SUCCESS' THEN amount END),
+                               TOTAL(CASE WHEN position = 'FAIL' THEN amount END),
+                               COUNT(DISTINCT user_id),
+                               TOTAL(CASE WHEN status = 'OPEN' AND race_id NOT IN (SELECT race_id FROM settlements)
+                                          THEN amount END),
+                               TOTAL(CASE WHEN position = 'SUCCESS' THEN shares END),
+                               TOTAL(CASE WHEN position = 'FAIL' THEN shares END)
+                        FROM positions GROUP BY race_id''')
+
+    def import_json(self, path):
+        """One-off migration from an old bets.json file"""
+        bets = JsonLedger(path).load_all()
+        if bets:
+            self.save_all(bets)
+        return len(bets)
+
+
+def _position_dict(row):
+    status, payout = row['status'], row['payout']
+    if row['settled_outcome'] is not None:
+        status, payout = settled_position(row['position'], row['amount'], row['shares'], row['settled_outcome'],
+                                          row['settled_ratio'], row['settled_refunded'])
+    return {
+        'id': row['id'],
+        'race_id': row['race_id'],
+        'position': row['position'],
+        'amount': row['amount'],
+        'shares': row['shares'],
+        'timestamp': row['timestamp'],
+        'status': status,
+        'payout': payout
+    }
+
+
+def _market_dict(row):
+    return {k: row[k] for k in ('success_volume', 'fail_volume', 'participants', 'open_interest',
+                                'success_shares', 'fail_shares')}
+
+
+def _settlement_dict(row):
+    result = {k: row[k] for k in row.keys()}
+    result['refunded'] = bool(result['refunded'])
+    return result
+
+
+LEDGER_BACKENDS = {
+    'json': JsonLedger,
+    'sqlite': SqliteLedger,
+}
+
+
+def get_ledger(backend, path):
+    """Build a ledger for the configured backend name"""
+    try:
+        return LEDGER_BACKENDS[backend](path)
+    except KeyError:
+        raise ValueError(f"Unknown ledger backend: {backend}")
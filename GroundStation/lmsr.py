@@ -0,0 +1,81 @@
+import numpy as np
+
+# Logarithmic market scoring rule (Hanson): the market maker always quotes a
+# price, and every winning share pays 1 at settlement.
+#   cost C(q) = b * log(sum(exp(q / b)))     price_i = exp(q_i / b - C(q) / b)
+# q is the outstanding share vector (one entry per outcome, in POSITIONS order).
+# Everything goes through log-sum-exp, so large share counts never overflow.
+LIQUIDITY = 500.0  # b: higher means prices move less per bet; the house can lose at most b * log(2) per race
+
+
+def log_partition(shares, b=LIQUIDITY):
+    """C(q) / b, computed stably"""
+    z = np.asarray(shares, dtype=np.float64) / b
+    top = z.max()
+    return top + np.log(np.exp(z - top).sum())
+
+
+def cost(shares, b=LIQUIDITY):
+    """Total the market maker has collected to reach share vector q"""
+    return b * log_partition(shares, b)
+
+
+def prices(shares, b=LIQUIDITY):
+    """Instantaneous price of every outcome (sums to 1)"""
+    z = np.asarray(shares, dtype=np.float64) / b
+    return np.exp(z - log_partition(shares, b))
+
+
+class LmsrMarket:
+    """
+    One race's share vector with its log-partition cached, so a quote or a
+    fill is O(1) work per outcome instead of re-summing the book.
+    """
+
+    def __init__(self, shares, b=LIQUIDITY):
+        self.b = b
+        self.shares = np.array(shares, dtype=np.float64)
+        self._lse = log_partition(self.shares, b)
+
+    def log_price(self, outcome):
+        return self.shares[outcome] / self.b - self._lse
+
+    def price(self, outcome):
+        return float(np.exp(self.log_price(outcome)))
+
+    def cost_to_buy(self, outcome, shares):
+        """Cost of `shares` more shares of an outcome (scalar or array)"""
+        # C(q + x e_i) - C(q) = b * log((1 - p) + p * exp(x / b))
+        log_p = self.log_price(outcome)
+        x = np.asarray(shares, dtype=np.float64)
+        with np.errstate(divide='ignore'):
+            return self.b * np.logaddexp(np.log(-np.expm1(log_p)), log_p + x / self.b)
+
+    def shares_for(self, outcome, amount):
+        """Shares an `amount` buys (scalar or array): the inverse of cost_to_buy"""
+        # x = b * log(1 + (exp(amount / b) - 1) / p), with log(exp(y) - 1) = y + log(1 - exp(-y))
+        y = np.asarray(amount, dtype=np.float64) / self.b
+        with np.errstate(divide='ignore'):
+            log_expm1 = y + np.log(-np.expm1(-y))
+        return self.b * np.logaddexp(0.0, log_expm1 - self.log_price(outcome))
+
+    def quote(self, outcome, amounts):
+        """Batched quote for many hypothetical order sizes: (shares, average price) arrays"""
+        amounts = np.asarray(amounts, dtype=np.float64)
+        shares = self.shares_for(outcome, amounts)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            average = np.where(shares > 0, amounts / shares, self.price(outcome))
+        return shares, average
+
+    def buy(self, outcome, amount):
+        """Fill an order of `amount`; returns the shares bought"""
+        shares = float(self.shares_for(outcome, amount))
+        self.shares[outcome] += shares
+        # The cost function rose by exactly `amount`, so the cache updates without a re-sum
+        self._lse += amount / self.b
+        return shares
+
+
+def fill(shares, outcome, amount, b=LIQUIDITY):
+    """Shares bought for `amount` against share vector `shares` (the ledger's fill_fn)"""
+    return LmsrMarket(shares, b).buy(outcome, amount)
@@ -0,0 +1,111 @@
+import hashlib
+import numpy as np
+from burst import LOG_EVENT_DTYPE
+
+# Domain-separated SHA-256 so a leaf can never be passed off as an inner node
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+HASH_SIZE = 32
+
+
+def as_events(run_data):
+    """Accept a LOG_EVENT_DTYPE array or a list of {timestamp, type, value} dicts"""
+    if isinstance(run_data, np.ndarray):
+        return run_data.astype(LOG_EVENT_DTYPE, copy=False)
+    events = np.empty(len(run_data), dtype=LOG_EVENT_DTYPE)
+    for name in LOG_EVENT_DTYPE.names:
+        events[name] = [x[name] for x in run_data]
+    return events
+
+
+def encode_event(timestamp, type_, value):
+    """Canonical 7-byte LogEvent encoding (same bytes the robot sends in binary mode)"""
+    return np.array([(timestamp, type_, value)], dtype=LOG_EVENT_DTYPE).tobytes()
+
+
+def leaf_hash(encoded_event):
+    return hashlib.sha256(LEAF_PREFIX + encoded_event).digest()
+
+
+def _hash_records(prefix, packed, size):
+    """SHA-256 of prefix + each `size`-byte record of `packed`, as one packed bytes object"""
+    # Lay the prefixed records out contiguously with NumPy, then hash zero-copy slices
+    records = np.frombuffer(packed, dtype=np.uint8).reshape(-1, size)
+    prefixed = np.empty((len(records), size + 1), dtype=np.uint8)
+    prefixed[:, 0] = prefix[0]
+    prefixed[:, 1:] = records
+    view = memoryview(prefixed.tobytes())
+    step = size + 1
+    sha = hashlib.sha256
+    return b''.join([sha(view[i:i + step]).digest() for i in range(0, len(view), step)])
+
+
+def _hash_level(level):
+    """Hash adjacent pairs of a packed level; an odd last node is promoted unchanged"""
+    n = len(level) // HASH_SIZE
+    paired = (n // 2) * 2 * HASH_SIZE
+    out = _hash_records(NODE_PREFIX, level[:paired], 2 * HASH_SIZE)
+    return out + level[paired:]
+
+
+class MerkleTree:
+    """Merkle tree over a run's LogEvents, with O(log n) inclusion proofs"""
+
+    def __init__(self, leaves):
+        # Each level is one packed bytes object (n * 32) rather than n small objects
+        self.levels = [leaves]
+        while len(self.levels[-1]) > HASH_SIZE:
+            self.levels.append(_hash_level(self.levels[-1]))
+
+    @classmethod
+    def from_events(cls, run_data):
+        events = as_events(run_data)
+        return cls(_hash_records(LEAF_PREFIX, events.tobytes(), LOG_EVENT_DTYPE.itemsize))
+
+    def __len__(self):
+        return len(self.levels[0]) // HASH_SIZE
+
+    @property
+    def root(self):
+        return self.levels[-1][:HASH_SIZE] if len(self) else hashlib.sha256(b'').digest()
+
+    @property
+    def root_hex(self):
+        return self.root.hex()
+
+    def proof(self, index):
+        """Sibling hashes from leaf to root, as [(hex, 'L'|'R'), ...]"""
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        path = []
+        for level in self.levels[:-1]:
+            n = len(level) // HASH_SIZE
+            sibling = index ^ 1
+            if sibling < n:
+                node = level[sibling * HASH_SIZE:(sibling + 1) * HASH_SIZE]
+                path.append((node.hex(), 'L' if sibling < index else 'R'))
+            index //= 2
+        return path
+
+
+def verify_proof(encoded_event, proof, root_hex):
+    """Check one event's inclusion against a committed root"""
+    return verify_path(leaf_hash(encoded_event), proof, root_hex)
+
+
+def verify_path(node, proof, root_hex):
+    """Walk a proof up from an already-hashed node (e.g. a run root inside a batch root)"""
+    for sibling_hex, side in proof:
+        sibling = bytes.fromhex(sibling_hex)
+        node = hashlib.sha256(NODE_PREFIX + (sibling + node if side == 'L' else node + sibling)).digest()
+    return node.hex() == root_hex
+
+
+def find_event(events, timestamp, type_=None):
+    """Index of the first event at `timestamp` (optionally of a given type), or None"""
+    events = as_events(events)
+    mask = events['timestamp'] == timestamp
+    if type_ is not None:
+        mask &= events['type'] == type_
+    hits = np.flatnonzero(mask)
+    return int(hits[0]) if len(hits) else None
@@ -0,0 +1,167 @@
+import bisect
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+
+# Opt-in: every helper below is a flag check and nothing else until enable() is called
+enabled = False
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+PROFILE_INTERVAL = 0.005  # Seconds between profiler samples
+MAX_PROFILE_SECONDS = 60
+
+_registry = []
+_lock = threading.Lock()
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+class Histogram:
+    """Prometheus histogram with fixed buckets and optional labels"""
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        with _lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts (not cumulative) plus sum and count
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with _lock:
+            series = [(k, list(v[0]), v[1], v[2]) for k, v in self._series.items()]
+        for label_values, counts, total, count in series:
+            base = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_labels(self.labels + ("le",), label_values + (le,))} {cumulative}')
+            lines.append(f'{self.name}_sum{base} {total}')
+            lines.append(f'{self.name}_count{base} {count}')
+        return lines
+
+
+class Counter:
+    """Prometheus counter with optional labels"""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, amount=1, *label_values):
+        with _lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with _lock:
+            values = list(self._values.items())
+        lines += [f'{self.name}{_labels(self.labels, k)} {v}' for k, v in values]
+        return lines
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"') for v in values)
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, escaped)) + '}'
+
+
+REQUEST_SECONDS = Histogram('groundstation_request_seconds', 'HTTP request latency by route',
+                            labels=('method', 'route', 'status'))
+FUNCTION_SECONDS = Histogram('groundstation_function_seconds', 'Time spent in hot-path functions',
+                             labels=('function',))
+JSON_BYTES = Counter('groundstation_json_bytes_total', 'JSON bytes parsed or written',
+                     labels=('direction',))
+
+
+def timed(fn):
+    """Record each call of fn in FUNCTION_SECONDS while metrics are enabled"""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            FUNCTION_SECONDS.observe(time.perf_counter() - start, name)
+    return wrapper
+
+
+def count_json(direction, nbytes):
+    if enabled and nbytes:
+        JSON_BYTES.inc(nbytes, direction)
+
+
+def render(extra=()):
+    """Every registered metric in Prometheus text format, plus pre-rendered `extra` lines"""
+    lines = []
+    for metric in _registry:
+        lines += metric.render()
+    lines += extra
+    return '\n'.join(lines) + '\n'
+
+
+def render_ingest(stats, prefix='groundstation_bridge_serial'):
+    """Bridge SerialIngest counters (from its state frames) as Prometheus lines"""
+    lines = []
+    for key, value in sorted(stats.items()):
+        if not isinstance(value, (int, float)):
+            continue
+        # backlog is a level, the rest only ever grow
+        kind = 'gauge' if key == 'backlog' else 'counter'
+        name = f'{prefix}_{key}' if kind == 'gauge' else f'{prefix}_{key}_total'
+        lines += [f'# TYPE {name} {kind}', f'{name} {value}']
+    return lines
+
+
+# ===== SAMPLING PROFILER =====
+
+def profile(seconds, interval=PROFILE_INTERVAL):
+    """
+    Sample every other thread's stack for `seconds` and return folded stacks
+    ("outer;inner count" per line), ready for flamegraph.pl or speedscope.
+    Runs on the calling thread, so nothing is sampled when no one asks.
+    """
+    seconds = min(seconds, MAX_PROFILE_SECONDS)
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    stacks = _Tally()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            parts = []
+            while frame is not None:
+                code = frame.f_code
+                parts.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            parts.append(names.get(ident, 'thread'))
+            stacks[';'.join(reversed(parts))] += 1
+        time.sleep(interval)
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
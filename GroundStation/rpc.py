@@ -0,0 +1,241 @@
+import asyncio
+import base64
+import itertools
+import threading
+import time
+import httpx
+from solders.hash import Hash
+from solders.message import Message
+from solders.transaction import Transaction
+
+RPC_URL = "http://127.0.0.1:8899"
+RPC_TIMEOUT = 10.0
+MAX_CONNECTIONS = 16
+BLOCKHASH_TTL = 20.0       # Blockhashes stay valid for ~60s; refresh well before that
+STATUS_BATCH = 256         # getSignatureStatuses limit per call
+FINALITY = {"processed": 0, "confirmed": 1, "finalized": 2}
+
+
+class RpcError(Exception):
+    """JSON-RPC error returned by the node"""
+
+
+class _RpcBase:
+    """Request building and caching shared by the sync and async clients"""
+
+    def __init__(self, url):
+        self.url = url
+        self._ids = itertools.count(1)
+        self._blockhash = None
+        self._blockhash_time = 0.0
+
+    def _request(self, method, params):
+        return {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": list(params)}
+
+    @staticmethod
+    def _result(response):
+        if "error" in response:
+            raise RpcError(response["error"])
+        return response["result"]
+
+    def _cached_blockhash(self):
+        if self._blockhash and time.monotonic() - self._blockhash_time < BLOCKHASH_TTL:
+            return self._blockhash
+        return None
+
+    def _store_blockhash(self, result):
+        self._blockhash = Hash.from_string(result["value"]["blockhash"])
+        self._blockhash_time = time.monotonic()
+        return self._blockhash
+
+    @staticmethod
+    def _encode_tx(instructions, payer, blockhash):
+        message = Message.new_with_blockhash(instructions, payer.pubkey(), blockhash)
+        tx = Transaction([payer], message, blockhash)
+        return base64.b64encode(bytes(tx)).decode("ascii")
+
+    @staticmethod
+    def _reached(status, commitment):
+        if status is None or status.get("err") is not None:
+            return False
+        level = status.get("confirmationStatus") or "processed"
+        return FINALITY[level] >= FINALITY[commitment]
+
+
+class RpcClient(_RpcBase):
+    """
+    Keep-alive JSON-RPC client shared across GroundStation components.
+    Thread-safe; use get_client() rather than building one per caller.
+    """
+
+    def __init__(self, url=RPC_URL, timeout=RPC_TIMEOUT, max_connections=MAX_CONNECTIONS):
+        super().__init__(url)
+        self._http = httpx.Client(
+            timeout=httpx.Timeout(timeout, connect=3.0),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections,
+                                keepalive_expiry=30.0))
+        self._lock = threading.Lock()
+
+    def call(self, method, *params):
+        with self._lock:
+            request = self._request(method, params)
+        response = self._http.post(self.url, json=request)
+        response.raise_for_status()
+        return self._result(response.json())
+
+    def batch(self, calls):
+        """Send [(method, params), ...] as one JSON-RPC batch; results come back in order"""
+        if not calls:
+            return []
+        with self._lock:
+            requests = [self._request(method, params) for method, params in calls]
+        response = self._http.post(self.url, json=requests)
+        response.raise_for_status()
+        by_id = {r["id"]: r for r in response.json()}
+        return [self._result(by_id[r["id"]]) for r in requests]
+
+    def is_connected(self):
+        try:
+            return self.call("getHealth") == "ok"
+        except Exception:
+            return False
+
+    def latest_blockhash(self):
+        with self._lock:
+            cached = self._cached_blockhash()
+        if cached:
+            return cached
+        result = self.call("getLatestBlockhash", {"commitment": "confirmed"})
+        with self._lock:
+            return self._store_blockhash(result)
+
+    def get_balance(self, pubkey):
+        return self.call("getBalance", str(pubkey))["value"]
+
+    def request_airdrop(self, pubkey, lamports):
+        return self.call("requestAirdrop", str(pubkey), lamports)
+
+    def send_instructions(self, instructions, payer):
+        """Sign with a cached blockhash and send; returns the signature string"""
+        tx = self._encode_tx(instructions, payer, self.latest_blockhash())
+        return self.call("sendTransaction", tx, {"encoding": "base64"})
+
+    def signature_statuses(self, signatures):
+        """{signature: status or None}, up to STATUS_BATCH signatures per request, one round trip"""
+        signatures = list(signatures)
+        chunks = [signatures[i:i + STATUS_BATCH] for i in range(0, len(signatures), STATUS_BATCH)]
+        results = self.batch([("getSignatureStatuses", [chunk]) for chunk in chunks])
+        statuses = {}
+        for chunk, result in zip(chunks, results):
+            statuses.update(zip(chunk, result["value"]))
+        return statuses
+
+    def confirm(self, signatures, commitment="confirmed", timeout=30.0, poll=0.5):
+        """Poll all outstanding signatures together; returns {signature: confirmed?}"""
+        outstanding = set(signatures)
+        done = {}
+        deadline = time.monotonic() + timeout
+        while outstanding and time.monotonic() < deadline:
+            for sig, status in self.signature_statuses(outstanding).items():
+                if status is not None and status.get("err") is not None:
+                    done[sig] = False
+                    outstanding.discard(sig)
+                elif self._reached(status, commitment):
+                    done[sig] = True
+                    outstanding.discard(sig)
+            if outstanding:
+                time.sleep(poll)
+        done.update((sig, False) for sig in outstanding)
+        return done
+
+    def close(self):
+        self._http.close()
+
+
+class AsyncRpcClient(_RpcBase):
+    """asyncio variant: many sends in flight at once, confirmations pipelined"""
+
+    def __init__(self, url=RPC_URL, timeout=RPC_TIMEOUT, max_connections=MAX_CONNECTIONS):
+        super().__init__(url)
+        self._http = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=3.0),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections,
+                                keepalive_expiry=30.0))
+        self._blockhash_lock = asyncio.Lock()
+
+    async def call(self, method, *params):
+        response = await self._http.post(self.url, json=self._request(method, params))
+        response.raise_for_status()
+        return self._result(response.json())
+
+    async def batch(self, calls):
+        if not calls:
+            return []
+        requests = [self._request(method, params) for method, params in calls]
+        response = await self._http.post(self.url, json=requests)
+        response.raise_for_status()
+        by_id = {r["id"]: r for r in response.json()}
+        return [self._result(by_id[r["id"]]) for r in requests]
+
+    async def latest_blockhash(self):
+        # One fetch serves every concurrent sender
+        async with self._blockhash_lock:
+            cached = self._cached_blockhash()
+            if cached:
+                return cached
+            return self._store_blockhash(await self.call("getLatestBlockhash", {"commitment": "confirmed"}))
+
+    async def send_instructions(self, instructions, payer):
+        tx = self._encode_tx(instructions, payer, await self.latest_blockhash())
+        return await self.call("sendTransaction", tx, {"encoding": "base64"})
+
+    async def signature_statuses(self, signatures):
+        signatures = list(signatures)
+        chunks = [signatures[i:i + STATUS_BATCH] for i in range(0, len(signatures), STATUS_BATCH)]
+        results = await self.batch([("getSignatureStatuses", [chunk]) for chunk in chunks])
+        statuses = {}
+        for chunk, result in zip(chunks, results):
+            statuses.update(zip(chunk, result["value"]))
+        return statuses
+
+    async def confirm(self, signatures, commitment="confirmed", timeout=30.0, poll=0.5):
+        outstanding = set(signatures)
+        done = {}
+        deadline = time.monotonic() + timeout
+        while outstanding and time.monotonic() < deadline:
+            for sig, status in (await self.signature_statuses(outstanding)).items():
+                if status is not None and status.get("err") is not None:
+                    done[sig] = False
+                    outstanding.discard(sig)
+                elif self._reached(status, commitment):
+                    done[sig] = True
+                    outstanding.discard(sig)
+            if outstanding:
+                await asyncio.sleep(poll)
+        done.update((sig, False) for sig in outstanding)
+        return done
+
+    async def send_and_confirm_many(self, instruction_sets, payer, commitment="confirmed", timeout=30.0):
+        """Send every transaction concurrently, then confirm them all in shared status polls"""
+        results = await asyncio.gather(*(self.send_instructions(ixs, payer) for ixs in instruction_sets),
+                                       return_exceptions=True)
+        signatures = [r for r in results if isinstance(r, str)]
+        confirmed = await self.confirm(signatures, commitment, timeout)
+        return [r if isinstance(r, Exception) else (r, confirmed.get(r, False)) for r in results]
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_client(url=RPC_URL):
+    """Process-wide RpcClient for `url` (one connection pool per node)"""
+    with _shared_lock:
+        if url not in _shared:
+            _shared[url] = RpcClient(url)
+        return _shared[url]
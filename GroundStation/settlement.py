@@ -0,0 +1,28 @@
+# YES = "Finish in <45 seconds", NO = "Crashes or takes >45 seconds"
+SUCCESS_TIME_LIMIT = 45.0
+HOUSE_RAKE = 0.0  # Fraction of the pool kept back before paying winners
+
+
+def resolve_outcome(final_time):
+    """Winning side for a finished race"""
+    return 'SUCCESS' if final_time < SUCCESS_TIME_LIMIT else 'FAIL'
+
+
+def pari_mutuel(winning_stake, pool, rake=HOUSE_RAKE):
+    """
+    Payout per unit of winning stake from a race's pari-mutuel totals.
+
+    Winners split the whole pool in proportion to their stake, so one ratio
+    prices every winning position. If nobody backed the winning side, every
+    stake is refunded. Returns (payout_ratio, refunded).
+    """
+    if winning_stake <= 0:
+        return 1.0, True
+    return pool * (1.0 - rake) / winning_stake, False
+
+
+def settle_race(ledger, race_id, final_time, final_score=0, rake=HOUSE_RAKE):
+    """Pay out every OPEN position for a race in one ledger transaction (idempotent)"""
+    outcome = resolve_outcome(final_time)
+    return ledger.settle_race(race_id, outcome, final_time, final_score,
+                              lambda winning_stake, pool: pari_mutuel(winning_stake, pool, rake))
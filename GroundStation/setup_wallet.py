@@ -1,8 +1,7 @@
 import json
 import time
 from solders.keypair import Keypair
-from solana.rpc.api import Client
-from solders.pubkey import Pubkey
+from rpc import get_client
 
 # CONFIGURATION
 WALLET_FILENAME = "hackathon-wallet.json"
@@ -30,7 +29,7 @@ def create_and_fund_wallet():
     # Without this, your robot cannot pay the 0.000005 SOL fee to record the score.
     print(f"💸 Attempting to airdrop 10 SOL to {new_keypair.pubkey()}...")
     
-    client = Client(LOCAL_RPC_URL)
+    client = get_client(LOCAL_RPC_URL)
     
     try:
         # Check if Validator is actually running
@@ -41,16 +40,16 @@ def create_and_fund_wallet():
 
         # Request Airdrop
         # Note: 'confirm_transaction' is often needed immediately after airdrop on localnet
-        airdrop_sig = client.request_airdrop(new_keypair.pubkey(), AIRDROP_AMOUNT).value
+        airdrop_sig = client.request_airdrop(new_keypair.pubkey(), AIRDROP_AMOUNT)
         
         print(f"   -> Airdrop Sent! Signature: {airdrop_sig}")
         print("   -> Waiting for confirmation...")
         
         # Wait for the money to actually arrive
-        client.confirm_transaction(airdrop_sig)
+        client.confirm([airdrop_sig])
         
         # 4. VERIFY BALANCE
-        balance = client.get_balance(new_keypair.pubkey()).value
+        balance = client.get_balance(new_keypair.pubkey())
         print(f"✅ SUCCESS! New Balance: {balance / 10**9} SOL")
         print("----------------------------------------")
         print("🚀 YOU ARE READY. Run 'bridge.py' now.")
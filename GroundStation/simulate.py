@@ -0,0 +1,307 @@
+"""
+Seeded simulation and replay of robot serial streams.
+
+  python simulate.py run --robots 64 --seed 1 --speed 100 --duration 30
+  python simulate.py run --robots 16 --ledger sim.db --bettors 200      # also stress settlement
+  python simulate.py generate --robots 4 --runs 3 --out recordings
+  python simulate.py replay recordings/*.log --speed 10
+
+Streams are the robot's own serial protocol (LOG: lines, SOLANA_RECORD:, the
+data burst), generated from a seed or read from a raw capture of a real port.
+They are written into in-memory serial ports at 1x to 1000x real time (0 =
+as fast as possible) and read by the normal SerialIngest threads and
+supervisor loop, so parsing, archiving, settlement and the state bus all run
+exactly as they do with hardware. The same seed always produces the same bytes.
+"""
+import argparse
+import glob
+import os
+import random
+import threading
+import time
+
+READ_TIMEOUT = 0.1
+SERIAL_BUFFER = 1 << 20     # Bytes a virtual port holds before it overruns, like a UART buffer
+HZ = 100                    # Telemetry rate of generated runs
+RUN_SECONDS = (30.0, 60.0)  # Generated run lengths; SUCCESS_TIME_LIMIT (45 s) falls inside
+PAUSE_SECONDS = 5.0         # Between runs of one robot
+MAX_SPEED = 1000
+
+
+# ===== STREAMS =====
+
+def robot_script(rng, hz=HZ, run_seconds=RUN_SECONDS, pause=PAUSE_SECONDS, runs=None):
+    """
+    (time_s, bytes) chunks of a robot's serial output, run after run.
+    run_seconds is a fixed length or a (low, high) range drawn per run.
+    """
+    period = 1.0 / hz
+    start = 0.0
+    run = 0
+    while runs is None or run < runs:
+        length = rng.uniform(*run_seconds) if isinstance(run_seconds, tuple) else run_seconds
+        events, left, right, dist = [], 0, 0, 300
+        ticks = int(length * hz)
+        for tick in range(ticks):
+            t_ms = int(tick * period * 1000)
+            left += rng.randint(8, 12)
+            right += rng.randint(8, 12)
+            dist = max(5, dist + rng.randint(-15, 12))
+            yield start + tick * period, f"LOG:{t_ms},{left},{right},{dist},\n".encode()
+            if dist < 20 and rng.random() < 0.05:
+                events.append((t_ms, 2, -5))   # EVENT_OBSTACLE
+            elif rng.random() < 0.004:
+                events.append((t_ms, 3, 1))    # Box picked up
+            elif rng.random() < 0.002:
+                events.append((t_ms, 5, rng.randint(5, 15)))  # EVENT_SHOT
+        end_ms = int(ticks * period * 1000)
+        score = sum(v for _, kind, v in events if kind == 5)
+        body = "".join(f"{t}:{kind}:{v}\n" for t, kind, v in events)
+        yield start + ticks * period, (f"SOLANA_RECORD:{score}:{end_ms}\n"
+                                       f"---BEGIN_BURST---\n{body}---END_BURST---\n").encode()
+        start += ticks * period + pause
+        run += 1
+
+
+def recording_script(data, pause=PAUSE_SECONDS):
+    """
+    (time_s, bytes) lines of a raw serial capture, timed by the LOG timestamps.
+    A timestamp going backwards starts a new run `pause` seconds later.
+    """
+    base, now, last_ms = 0.0, 0.0, None
+    for line in data.splitlines(keepends=True):
+        if line.startswith(b"LOG:"):
+            try:
+                t_ms = int(line[4:].split(b",", 1)[0])
+            except ValueError:
+                t_ms = None
+            if t_ms is not None:
+                if last_ms is not None and t_ms < last_ms:
+                    base = now + pause
+                last_ms = t_ms
+                now = base + t_ms / 1000.0
+        yield now, line
+
+
+def generate(path, seed, robot, runs, hz=HZ):
+    """Write one robot's seeded runs to a raw capture file"""
+    rng = random.Random(f"{seed}-{robot}")
+    with open(path, "wb") as f:
+        for _, chunk in robot_script(rng, hz, runs=runs):
+            f.write(chunk)
+
+
+# ===== VIRTUAL PORTS =====
+
+class VirtualSerial:
+    """In-memory serial port: the replayer writes into it, SerialIngest reads it like pyserial"""
+
+    def __init__(self, name, timeout=READ_TIMEOUT, buffer_size=SERIAL_BUFFER):
+        self.name = name
+        self.timeout = timeout
+        self.buffer_size = buffer_size
+        self.connected = True
+        self.overruns = 0  # Bytes lost because the reader fell behind
+        self._buf = bytearray()
+        self._cond = threading.Condition()
+
+    @property
+    def in_waiting(self):
+        return len(self._buf)
+
+    def feed(self, data, block=False):
+        """Append bytes from the "robot"; block=True waits for room instead of overrunning"""
+        with self._cond:
+            if block:
+                self._cond.wait_for(lambda: len(self._buf) + len(data) <= self.buffer_size)
+            room = self.buffer_size - len(self._buf)
+            if len(data) > room:
+                # A real UART drops what it can't hold; so do we
+                self.overruns += len(data) - room
+                data = data[:room]
+            self._buf += data
+            self._cond.notify_all()
+
+    def read(self, size=1):
+        with self._cond:
+            if not self._buf:
+                self._cond.wait(self.timeout)
+            chunk = bytes(self._buf[:size])
+            del self._buf[:size]
+            self._cond.notify_all()
+        return chunk
+
+    def close(self):
+        pass
+
+
+class Replayer:
+    """
+    One thread that releases every virtual robot's chunks on schedule:
+    stream time = wall time * speed (speed 0 releases everything at once).
+    """
+
+    def __init__(self, speed=1.0):
+        if speed < 0 or speed > MAX_SPEED:
+            raise ValueError(f"speed must be between 0 and {MAX_SPEED}")
+        self.speed = speed
+        self.streams = []  # [port, script iterator, next (time, bytes) or None]
+        self.bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='replayer', daemon=True)
+
+    def add(self, port, script):
+        script = iter(script)
+        self.streams.append([port, script, next(script, None)])
+        return port
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def done(self):
+        return all(s[2] is None for s in self.streams)
+
+    def _run(self):
+        start = time.monotonic()
+        while not self._stop.is_set() and not self.done:
+            now = (time.monotonic() - start) * self.speed if self.speed else float('inf')
+            soonest = None
+            for stream in self.streams:
+                port, script, item = stream
+                chunks = []
+                # Coalesce everything due into one write, as a serial driver would
+                while item is not None and item[0] <= now and len(chunks) < 4096:
+                    chunks.append(item[1])
+                    item = next(script, None)
+                stream[2] = item
+                if chunks:
+                    data = b"".join(chunks)
+                    self.bytes += len(data)
+                    # Unpaced runs go as fast as the reader drains, without overrunning
+                    port.feed(data, block=not self.speed)
+                if item is not None and (soonest is None or item[0] < soonest):
+                    soonest = item[0]
+            if soonest is not None and self.speed:
+                delay = (soonest - (time.monotonic() - start) * self.speed) / self.speed
+                if delay > 0:
+                    self._stop.wait(min(delay, 0.05))
+
+
+def virtual_port(name="sim", seed=0, speed=1.0, hz=HZ, runs=None):
+    """A started single-robot simulation, for bridge.py's SIMULATION_MODE"""
+    replayer = Replayer(speed)
+    port = replayer.add(VirtualSerial(name), robot_script(random.Random(f"{seed}-{name}"), hz, runs=runs))
+    replayer.start()
+    return port
+
+
+# ===== SCENARIOS =====
+
+def seed_bets(ledger, race_ids, bettors, seed):
+    """Seeded LMSR bets on every simulated race, so settlement has real work to do"""
+    import lmsr
+    rng = random.Random(f"{seed}-bets")
+    for race_id in race_ids:
+        # One transaction per race rather than one commit (and fsync) per bet
+        ledger.place_bets([{"user_id": f"sim-{race_id}-{i}", "position": rng.choice(("SUCCESS", "FAIL")),
+                            "amount": rng.randint(1, 100), "race_id": race_id} for i in range(bettors)],
+                          fill_fn=lmsr.fill)
+
+
+def run_scenario(names_scripts, speed, duration=None, ledger=None, bus_port=None):
+    """Feed (robot, script) pairs through a Supervisor until the scripts end or `duration` passes"""
+    from statebus import StatePublisher, STATE_BUS_PORT
+    import supervisor as sv
+
+    replayer = Replayer(speed)
+    ports = {name: replayer.add(VirtualSerial(name), script) for name, script in names_scripts}
+    robots = [{"robot": name, "port": f"virtual:{name}", "race_id": sv.SIM_RACE_BASE + i}
+              for i, name in enumerate(ports)]
+    supervisor = sv.Supervisor(robots, StatePublisher(port=bus_port or STATE_BUS_PORT), ledger,
+                               open_port=lambda name, port, baud: ports[name]).start()
+
+    wall, cpu = time.time(), time.process_time()
+    replayer.start()
+    end = wall + duration if duration else None
+    try:
+        while (end is None or time.time() < end) and not (replayer.done and supervisor.frames.empty()
+                                                          and all(p.in_waiting == 0 for p in ports.values())):
+            supervisor.step(supervisor.ui_interval)
+        supervisor.step(0)
+    except KeyboardInterrupt:
+        pass
+    replayer.stop()
+    elapsed = time.time() - wall
+    supervisor.print_stats()
+    supervisor.stop()
+
+    bursts = sum(i.snapshot()["bursts"] for i in supervisor.ingests.values())
+    overruns = sum(p.overruns for p in ports.values())
+    pace = f"{speed:g}x" if speed else "unpaced"
+    print(f"⏱ {elapsed:.1f}s {pace}: {replayer.bytes / 1e6:.1f} MB replayed, {bursts} runs finished, "
+          f"{overruns} bytes overrun, CPU {(time.process_time() - cpu) / elapsed * 100:.1f}% of one core")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='mode', required=True)
+
+    run = sub.add_parser('run', help='generate seeded robots and feed them through the supervisor')
+    run.add_argument('--robots', type=int, default=16)
+    run.add_argument('--seed', type=int, default=1)
+    run.add_argument('--runs', type=int, default=1, help='runs per robot')
+    run.add_argument('--hz', type=float, default=HZ)
+    run.add_argument('--speed', type=float, default=100.0, help=f'1 = real time, up to {MAX_SPEED}; 0 = unpaced')
+    run.add_argument('--duration', type=float, help='stop after this many wall-clock seconds')
+    run.add_argument('--ledger', help='settle the simulated races in this ledger file (never the real bets.db)')
+    run.add_argument('--bettors', type=int, default=0, help='seeded bets per race placed in --ledger first')
+    run.add_argument('--bus-port', type=int, help='state bus port (default: the real one, so the web app sees it)')
+
+    gen = sub.add_parser('generate', help='write seeded runs as raw serial captures')
+    gen.add_argument('--robots', type=int, default=1)
+    gen.add_argument('--seed', type=int, default=1)
+    gen.add_argument('--runs', type=int, default=1)
+    gen.add_argument('--hz', type=float, default=HZ)
+    gen.add_argument('--out', default='recordings')
+
+    rep = sub.add_parser('replay', help='replay raw serial captures, one virtual robot per file')
+    rep.add_argument('files', nargs='+')
+    rep.add_argument('--speed', type=float, default=1.0)
+    rep.add_argument('--duration', type=float)
+    rep.add_argument('--bus-port', type=int)
+
+    args = parser.parse_args()
+    if args.mode == 'generate':
+        os.makedirs(args.out, exist_ok=True)
+        for i in range(args.robots):
+            path = os.path.join(args.out, f"sim-{i}.log")
+            generate(path, args.seed, f"sim-{i}", args.runs, args.hz)
+            print(f"💾 {path}")
+        return
+
+    if args.mode == 'replay':
+        files = [f for pattern in args.files for f in sorted(glob.glob(pattern))]
+        scripts = []
+        for path in files:
+            with open(path, 'rb') as f:
+                scripts.append((os.path.splitext(os.path.basename(path))[0], recording_script(f.read())))
+        return run_scenario(scripts, args.speed, args.duration, bus_port=args.bus_port)
+
+    ledger = None
+    if args.ledger:
+        from ledger import SqliteLedger
+        import supervisor as sv
+        ledger = SqliteLedger(args.ledger)
+        seed_bets(ledger, [sv.SIM_RACE_BASE + i for i in range(args.robots)], args.bettors, args.seed)
+    scripts = [(f"sim-{i}", robot_script(random.Random(f"{args.seed}-sim-{i}"), args.hz, runs=args.runs))
+               for i in range(args.robots)]
+    run_scenario(scripts, args.speed, args.duration, ledger, args.bus_port)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,48 @@
 import json
-import hashlib
 from solders.keypair import Keypair
-from solana.rpc.api import Client
-from solana.transaction import Transaction
 from solders.instruction import Instruction
 from solders.pubkey import Pubkey
+from burst import summarize
+from merkle import MerkleTree, as_events
+from rpc import get_client
 
 class SolanaOptimizer:
     def __init__(self, wallet_path):
         with open(wallet_path, 'r') as f:
             self.kp = Keypair.from_bytes(json.load(f))
-        self.client = Client("http://127.0.0.1:8899")
+        self.client = get_client()
         self.memo_program = Pubkey.from_string("MemoSq4gqABAXKb96qnH8TysNcWxMyWCqXgDLGmfcQb")
+        self.last_tree = None  # MerkleTree of the last upload, for inclusion proofs
+
+    def commitment(self, run_data):
+        """Merkle root + summary for a run, without sending anything"""
+        # 1. Calculate Summary Stats (The "Headline")
+        events = as_events(run_data)
+        summary = summarize(events)
+
+        # 2. Create the "Data Fingerprint" (Merkle Root)
+        # This proves we have the full data without paying to store it all,
+        # and any single event can later be proven with MerkleTree.proof()
+        self.last_tree = MerkleTree.from_events(events)
+        return self.last_tree.root_hex, summary
+
+    def send_memo(self, payload):
+        """Send one memo transaction; raises on failure (used by CommitQueue)"""
+        ix = Instruction(
+            program_id=self.memo_program,
+            accounts=[],
+            data=payload.encode("utf-8")
+        )
+        return self.client.send_instructions([ix], self.kp)
 
     def batch_upload(self, run_data):
         """
         Takes a huge list of sensor logs, hashes them, and commits 
         ONLY the 'Fingerprint' (Hash) + Summary to the chain.
         This converts 1000 transactions into 1.
+        Blocks on the RPC; the bridge uses CommitQueue instead.
         """
-        # 1. Calculate Summary Stats (The "Headline")
-        summary = {
-            "events": len(run_data),
-            "obstacles_hit": sum(1 for x in run_data if x['type'] == 2),
-            "final_score": sum(x['value'] for x in run_data if x['type'] == 5),
-            "timestamp": run_data[-1]['timestamp'] if run_data else 0
-        }
-
-        # 2. Create the "Data Fingerprint" (Merkle Root equivalent)
-        # This proves we have the full data without paying to store it all
-        data_string = json.dumps(run_data, sort_keys=True)
-        data_hash = hashlib.sha256(data_string.encode()).hexdigest()
+        data_hash, summary = self.commitment(run_data)
 
         # 3. Construct the Payload
         # "PROTOCOL:HASH:SUMMARY_JSON"
@@ -39,17 +51,10 @@ class SolanaOptimizer:
         print(f"⚡ COMPRESSING: Uploading Proof for {len(run_data)} logs...")
         
         # 4. Mint the Transaction
-        ix = Instruction(
-            program_id=self.memo_program,
-            accounts=[],
-            data=payload.encode("utf-8")
-        )
-        txn = Transaction().add(ix)
-        
         try:
-            res = self.client.send_transaction(txn, self.kp)
-            print(f"✅ BATCH SECURED: {res.value}")
-            return str(res.value)
+            signature = self.send_memo(payload)
+            print(f"✅ BATCH SECURED: {signature}")
+            return signature
         except Exception as e:
             print(f"❌ UPLOAD FAILED: {e}")
             return None
\ No newline at end of file
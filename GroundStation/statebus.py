@@ -0,0 +1,110 @@
+import hashlib
+import json
+import socket
+import threading
+import time
+
+# Local pub/sub for race-state frames (bridge -> Flask app / Streamlit dashboard).
+# Loopback TCP with newline-delimited JSON, so it also works on Windows hosts.
+STATE_BUS_HOST = '127.0.0.1'
+STATE_BUS_PORT = 8765
+
+
+class StatePublisher:
+    """Bridge side: accepts subscribers and pushes every state frame to them"""
+
+    def __init__(self, host=STATE_BUS_HOST, port=STATE_BUS_PORT, send_timeout=0.05):
+        self.send_timeout = send_timeout
+        self._clients = []
+        self._lock = threading.Lock()
+        self._latest = None
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, port))
+        self._server.listen()
+        threading.Thread(target=self._accept_loop, name='statebus-accept', daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                return
+            client.settimeout(self.send_timeout)
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                # New subscribers get the current frame straight away
+                if self._latest is not None and not self._send(client, self._latest):
+                    continue
+                self._clients.append(client)
+
+    def _send(self, client, frame):
+        try:
+            client.sendall(frame)
+            return True
+        except OSError:
+            # Dead or too slow to keep up: drop it, it will reconnect and resync
+            client.close()
+            return False
+
+    def publish(self, state):
+        frame = (json.dumps(state) + '\n').encode('utf-8')
+        with self._lock:
+            self._latest = frame
+            self._clients = [c for c in self._clients if self._send(c, frame)]
+
+    def close(self):
+        self._server.close()
+        with self._lock:
+            for c in self._clients:
+                c.close()
+            self._clients = []
+
+
+class StateSubscriber:
+    """App side: holds the latest frame in memory and notifies on change"""
+
+    def __init__(self, host=STATE_BUS_HOST, port=STATE_BUS_PORT, on_change=None):
+        self.address = (host, port)
+        self.on_change = on_change
+        self.version = 0          # Frames received by this process, for wait_for_change
+        self.frame_digest = None  # Hash of the latest frame's bytes: the same in every process that got it
+        self._latest = None
+        self._connected = False
+        self._cond = threading.Condition()
+        threading.Thread(target=self._run, name='statebus-subscriber', daemon=True).start()
+
+    def get(self):
+        """Latest frame, or None while the bridge isn't connected"""
+        return self._latest if self._connected else None
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until a frame newer than `version` arrives; returns the current version"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version > version, timeout=timeout)
+            return self.version
+
+    def _run(self):
+        backoff = 0.5
+        while True:
+            try:
+                with socket.create_connection(self.address, timeout=5) as sock:
+                    sock.settimeout(None)
+                    self._connected = True
+                    backoff = 0.5
+                    for line in sock.makefile('rb'):
+                        self._receive(json.loads(line), hashlib.blake2b(line, digest_size=12).hexdigest())
+            except (OSError, ValueError):
+                pass
+            self._connected = False
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 5.0)
+
+    def _receive(self, state, digest):
+        with self._cond:
+            self._latest = state
+            self.frame_digest = digest
+            self.version += 1
+            self._cond.notify_all()
+        if self.on_change:
+            self.on_change(state)
@@ -153,6 +153,10 @@ function getTimeLabel() {
 
 // ===== UPDATE MARKET DATA =====
 function updateMarketData(data) {
+    if (data.race_id !== undefined) {
+        currentRaceId = data.race_id;
+    }
+
     // Update KPI cards
     document.getElementById('robot-status').textContent = data.status;
     document.getElementById('race-timer').textContent = data.time + 's';
@@ -214,7 +218,71 @@ function pollMarketData() {
         });
 }
 
+// ===== LIVE UPDATES (SSE, polling fallback) =====
+const POLL_INTERVAL = 2000;
+const STREAM_RETRY_MS = 30000;  // How soon to reopen a stream the server refused
+let marketStream = null;
+let pollTimer = null;
+
+function startPolling() {
+    if (!pollTimer) {
+        pollTimer = setInterval(pollMarketData, POLL_INTERVAL);
+    }
+}
+
+function stopPolling() {
+    clearInterval(pollTimer);
+    pollTimer = null;
+}
+
+function currentDisplayData() {
+    return {
+        status: document.getElementById('robot-status').textContent,
+        time: parseInt(document.getElementById('race-timer').textContent),
+        score: parseInt(document.getElementById('race-score').textContent),
+        race_id: currentRaceId,
+        market: initialMarketData
+    };
+}
+
+function startLiveUpdates() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+
+    // The server only sends a channel when it changed, so merge deltas into the last view
+    let liveData = currentDisplayData();
+    marketStream = new EventSource('/api/stream');
+    marketStream.addEventListener('state', event => {
+        liveData = Object.assign({}, liveData, JSON.parse(event.data));
+        updateMarketData(liveData);
+    });
+    marketStream.addEventListener('market', event => {
+        liveData = Object.assign({}, liveData, { market: JSON.parse(event.data) });
+        updateMarketData(liveData);
+    });
+
+    // EventSource reconnects on its own; poll only while it is down
+    marketStream.onopen = stopPolling;
+    marketStream.onerror = () => {
+        startPolling();
+        // A refused stream (503 when the worker is full) isn't retried by the browser
+        if (marketStream.readyState === EventSource.CLOSED) {
+            setTimeout(startLiveUpdates, STREAM_RETRY_MS);
+        }
+    };
+}
+
 // ===== PLACE BET =====
+const BET_RETRIES = 2;
+const BET_RETRY_DELAY_MS = 500;
+
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+}
+
 function placeBet(position) {
     const inputId = position === 'SUCCESS' ? 'success-amount' : 'fail-amount';
     const amountInput = document.getElementById(inputId);
@@ -238,10 +306,18 @@ function placeBet(position) {
     const buttons = document.querySelectorAll('.bet-btn');
     buttons.forEach(btn => btn.disabled = true);
 
-    axios.post('/api/place-bet', {
-        position: position,
-        amount: amount
-    })
+    // One key per bet: a retry after a dropped response or a 503 can't debit twice
+    const request = {race_id: currentRaceId, position: position, amount: amount};
+    const headers = {'Idempotency-Key': newIdempotencyKey()};
+    const send = (retries) => axios.post('/api/place-bet', request, {headers: headers})
+        .catch(error => {
+            if (retries > 0 && (!error.response || error.response.status === 503)) {
+                return new Promise(resolve => setTimeout(resolve, BET_RETRY_DELAY_MS)).then(() => send(retries - 1));
+            }
+            throw error;
+        });
+
+    send(BET_RETRIES)
     .then(response => {
         if (response.data.success) {
             // Update balance
@@ -251,15 +327,12 @@ function placeBet(position) {
             amountInput.value = '';
             
             // Show success message
-            showToast(`Bet placed: $${amount} on ${position}`);
+            showToast(`Bet placed: $${amount} on ${position} (${response.data.shares.toFixed(2)} shares @ $${response.data.avg_price.toFixed(3)})`);
             
             // Update market display immediately
-            updateMarketData({
-                status: document.getElementById('robot-status').textContent,
-                time: parseInt(document.getElementById('race-timer').textContent),
-                score: parseInt(document.getElementById('race-score').textContent),
+            updateMarketData(Object.assign(currentDisplayData(), {
                 market: response.data.market_data
-            });
+            }));
         }
     })
     .catch(error => {
@@ -277,7 +350,7 @@ function updateUserBalance(newBalance = null) {
     }
     
     // Fetch from server to ensure sync
-    axios.get('/api/user-positions')
+    axios.get('/api/user-positions', { params: { limit: 1 } })
         .then(response => {
             document.getElementById('user-balance').textContent = '$' + response.data.balance + ' FAN';
         })
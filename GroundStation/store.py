@@ -0,0 +1,135 @@
+import json
+import sqlite3
+import threading
+
+STORE_DB = 'store.db'
+REDIS_PREFIX = 'olympimarket:'
+
+# Mutable app state (current race, demo races, ...) lives behind this small
+# key/value interface so every worker sees the same values. Values are stored
+# as JSON, so callers always get their own copy back.
+
+
+class LocalStore:
+    """In-process store: single worker and tests"""
+
+    def __init__(self, url=None):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key)
+        return default if value is None else json.loads(value)
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = json.dumps(value)
+
+    def setdefault(self, key, value):
+        """Store `value` unless the key exists; returns the stored value"""
+        with self._lock:
+            current = self._data.setdefault(key, json.dumps(value))
+        return json.loads(current)
+
+    def update(self, key, fn, default=None):
+        """Atomic read-modify-write: stores and returns fn(current value)"""
+        with self._lock:
+            current = self._data.get(key)
+            value = fn(default if current is None else json.loads(current))
+            self._data[key] = json.dumps(value)
+        return value
+
+
+class SqliteStore:
+    """Store shared by every worker process on one host (SQLite, WAL)"""
+
+    def __init__(self, url=STORE_DB):
+        self.path = url or STORE_DB
+        self._local = threading.local()
+        self._conn().execute('CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, default=None):
+        row = self._conn().execute('SELECT value FROM kv WHERE key = ?', (key,)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set(self, key, value):
+        self._conn().execute('INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    def setdefault(self, key, value):
+        conn = self._conn()
+        conn.execute('INSERT OR IGNORE INTO kv (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+        return self.get(key)
+
+    def update(self, key, fn, default=None):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT value FROM kv WHERE key = ?', (key,)).fetchone()
+            value = fn(default if row is None else json.loads(row[0]))
+            conn.execute('INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+        return value
+
+
+class RedisStore:
+    """Store shared across hosts (needs the `redis` package)"""
+
+    def __init__(self, url='redis://localhost:6379/0'):
+        import redis
+        self._redis = redis.Redis.from_url(url or 'redis://localhost:6379/0')
+
+    def get(self, key, default=None):
+        value = self._redis.get(REDIS_PREFIX + key)
+        return default if value is None else json.loads(value)
+
+    def set(self, key, value):
+        self._redis.set(REDIS_PREFIX + key, json.dumps(value))
+
+    def setdefault(self, key, value):
+        self._redis.set(REDIS_PREFIX + key, json.dumps(value), nx=True)
+        return self.get(key)
+
+    def update(self, key, fn, default=None):
+        import redis
+        name = REDIS_PREFIX + key
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    # Optimistic transaction: retried if another worker wrote the key meanwhile
+                    pipe.watch(name)
+                    current = pipe.get(name)
+                    value = fn(default if current is None else json.loads(current))
+                    pipe.multi()
+                    pipe.set(name, json.dumps(value))
+                    pipe.execute()
+                    return value
+                except redis.WatchError:
+                    continue
+
+
+STORE_BACKENDS = {
+    'local': LocalStore,
+    'sqlite': SqliteStore,
+    'redis': RedisStore,
+}
+
+
+def get_store(backend, url=None):
+    """Build a shared store for the configured backend name"""
+    try:
+        return STORE_BACKENDS[backend](url)
+    except KeyError:
+        raise ValueError(f"Unknown store backend: {backend}")
@@ -0,0 +1,101 @@
+import json
+import threading
+
+
+def format_event(event, data):
+    """Encode one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class Broadcaster:
+    """
+    One shared producer for every /api/stream subscriber.
+
+    The producer thread builds a snapshot ({channel: payload}) at most once per
+    interval, and only while someone is listening. A channel whose payload
+    changed is encoded once and every subscriber just yields the same string,
+    so idle viewers cost a sleeping thread and nothing else.
+
+    Each subscriber holds a server thread for as long as it stays connected, so
+    at most max_subscribers are admitted; the rest are refused and poll instead.
+    """
+
+    def __init__(self, snapshot_fn, interval=1.0, heartbeat=15.0, max_subscribers=None):
+        self.snapshot_fn = snapshot_fn
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._version = 0
+        self._payloads = {}   # channel -> last payload
+        self._messages = {}   # channel -> (version, encoded message)
+        self._subscribers = 0
+        self._thread = None
+        self.stats = {'refused': 0}
+
+    def poke(self):
+        """Ask the producer to refresh now (e.g. right after a bet lands)"""
+        self._wake.set()
+
+    def publish(self, snapshot):
+        """Store changed channels and wake subscribers if anything changed"""
+        with self._cond:
+            changed = False
+            for channel, payload in snapshot.items():
+                if self._payloads.get(channel) != payload:
+                    self._version += 1
+                    self._payloads[channel] = payload
+                    self._messages[channel] = (self._version, format_event(channel, payload))
+                    changed = True
+            if changed:
+                self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._subscribers > 0)
+            try:
+                self.publish(self.snapshot_fn())
+            except Exception as e:
+                print(f"Stream producer error: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _ensure_started(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stream-producer', daemon=True)
+                self._thread.start()
+
+    def subscribe(self):
+        """Generator of SSE text for one client (send it straight to a streaming Response), or None when full"""
+        self._ensure_started()
+        with self._cond:
+            if self.max_subscribers is not None and self._subscribers >= self.max_subscribers:
+                self.stats['refused'] += 1
+                return None
+            self._subscribers += 1
+            self._cond.notify_all()
+        stream = self._stream()
+        # Run it up to its try block, so closing it releases the slot even if it's never iterated
+        next(stream)
+        return stream
+
+    def _stream(self):
+        try:
+            yield
+            yield "retry: 3000\n\n"
+            seen = 0
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._version > seen, timeout=self.heartbeat)
+                    pending = [msg for version, msg in self._messages.values() if version > seen]
+                    seen = self._version
+                if pending:
+                    yield ''.join(pending)
+                else:
+                    yield ': keepalive\n\n'
+        finally:
+            with self._cond:
+                self._subscribers -= 1
@@ -0,0 +1,483 @@
+"""
+Multi-robot bridge: one process reading every robot's serial port.
+
+  python supervisor.py robots.json          # ports from a config file
+  python supervisor.py --pty 16 --hz 100    # 16 stand-in robots on pseudo-terminals (POSIX)
+
+robots.json lists one entry per robot (protocol and baud are optional):
+  [{"robot": "bot-a", "port": "COM3", "race_id": 2},
+   {"robot": "bot-b", "port": "/dev/ttyUSB1", "race_id": 4, "protocol": "binary"}]
+
+Each port gets a reader thread (SerialIngest) that reconnects with backoff;
+all of them feed one frame queue consumed by a single loop that keeps
+separate run state per robot. bridge.py runs the same loop for a single
+robot; run one or the other, not both: they publish on the same state bus port.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import threading
+import time
+import serial
+from statebus import StatePublisher
+from ingest import SerialIngest, drain
+from burst import save_burst, summarize
+from archive import ArchiveWriter, RUN_ID_PATTERN
+from merkle import MerkleTree
+from commit_queue import CommitQueue, FakeMemoSender
+from ledger import SqliteLedger
+from settlement import settle_race
+from simulate import robot_script
+
+# --- CONFIG ---
+BAUD_RATE = 115200
+UI_UPDATE_HZ = 5          # Max rate of combined state frames (status changes go out at once)
+FRAME_QUEUE_SIZE = 65536  # Parsed frames buffered between all reader threads and the main loop
+STATS_INTERVAL = 10.0
+STATE_FILE = "race_state.json"
+WRITE_SNAPSHOT = True     # Keep race_state.json as a crash-recovery snapshot
+SNAPSHOT_INTERVAL = 1.0   # Max snapshot rate in seconds (status changes are always written)
+WALLET_PATH = "hackathon-wallet.json"
+COMMIT_BATCH = 8
+LEDGER_DB = "bets.db"
+SETTLE_ON_RECORD = True
+ARCHIVE_TELEMETRY = True
+READ_TIMEOUT = 0.1        # Serial read timeout, so reader threads notice a stop quickly
+RECONNECT_MIN = 0.5       # Seconds before the first reopen attempt; doubles up to RECONNECT_MAX
+RECONNECT_MAX = 30.0
+SIM_RACE_BASE = 100       # Stand-in and simulated robots race on SIM_RACE_BASE + index
+
+
+def load_config(path):
+    """Robot entries from a JSON config, checked for the fields the supervisor needs"""
+    with open(path) as f:
+        robots = json.load(f)
+    names = set()
+    for r in robots:
+        if not RUN_ID_PATTERN.match(str(r.get("robot", ""))):
+            raise ValueError(f"Robot names must be plain names (letters, digits, _ . -, not starting with .): {r.get('robot')!r}")
+        if r["robot"] in names:
+            raise ValueError(f"Duplicate robot: {r['robot']}")
+        if "port" not in r or not isinstance(r.get("race_id"), int):
+            raise ValueError(f"Robot {r['robot']} needs a port and an integer race_id")
+        names.add(r["robot"])
+    if not robots:
+        raise ValueError("No robots configured")
+    return robots
+
+
+class ReconnectingSerial:
+    """
+    pyserial port that never raises: a failed open or read closes it, waits
+    (exponential backoff) and reopens. SerialIngest's reader thread just sees
+    empty reads while the robot is unplugged.
+    """
+
+    def __init__(self, name, port, baud=BAUD_RATE, timeout=READ_TIMEOUT):
+        self.name = name
+        self.port = port
+        self.baud = baud
+        self.timeout = timeout
+        self.reconnects = 0
+        self._ser = None
+        self._backoff = RECONNECT_MIN
+
+    @property
+    def connected(self):
+        return self._ser is not None
+
+    @property
+    def in_waiting(self):
+        try:
+            return self._ser.in_waiting if self._ser else 0
+        except (serial.SerialException, OSError):
+            return 0
+
+    def read(self, size=1):
+        if self._ser is None and not self._open():
+            return b''
+        try:
+            return self._ser.read(size)
+        except (serial.SerialException, OSError) as e:
+            print(f"⚠️ {self.name}: lost {self.port} ({e})")
+            self.close()
+            self.reconnects += 1
+            return b''
+
+    def _open(self):
+        try:
+            self._ser = serial.Serial(self.port, self.baud, timeout=self.timeout)
+        except (serial.SerialException, OSError) as e:
+            print(f"❌ {self.name}: {self.port} unavailable ({e}), retrying in {self._backoff:.1f}s")
+            time.sleep(self._backoff)
+            self._backoff = min(self._backoff * 2, RECONNECT_MAX)
+            return False
+        print(f"✅ {self.name}: connected to {self.port}")
+        self._backoff = RECONNECT_MIN
+        return True
+
+    def close(self):
+        if self._ser is not None:
+            try:
+                self._ser.close()
+            except (serial.SerialException, OSError):
+                pass
+            self._ser = None
+
+
+class RobotSession:
+    """
+    One robot's run state (LOG -> RECORD -> BURST) and its latest state frame.
+
+    Every run is its own race: once a run's record settles race_id, the
+    session moves to next_race(), a fresh race with its market already open,
+    so bets placed between runs go to the coming one.
+    """
+
+    def __init__(self, robot, race_id, ledger=None, commit_queue=None, next_race=None):
+        self.robot = robot
+        self.race_id = race_id
+        self.ledger = ledger
+        self.commit_queue = commit_queue
+        self.next_race = next_race
+        self.run_id = None        # Set by the first LOG of a run
+        self.finished_run = None  # Run whose RECORD arrived but whose burst hasn't yet
+        self.telemetry = None     # ArchiveWriter for the current run's LOG lines
+        self.dirty = False        # state changed since it was last published
+        self.state = {}
+        self.update("WAITING", 0, 0)
+        self.dirty = False
+
+    def update(self, status, time_val, score_val, extra=None):
+        self.state = {
+            "robot": self.robot,
+            "race_id": self.race_id,
+            "status": status,
+            "time": round(time_val, 2),
+            "score": score_val,
+            "run_id": self.run_id,
+            "last_update": time.time()
+        }
+        if extra:
+            self.state.update(extra)
+        self.dirty = True
+
+    def new_run_id(self):
+        # Robots start runs in the same second, so the robot name keeps run ids unique
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{self.robot}"
+
+    def handle(self, frame):
+        """Apply one frame; returns True when the change should be published straight away"""
+        kind = frame[0]
+        if kind == "LOG":
+            if self.run_id is None:
+                self.run_id = self.new_run_id()
+                self.telemetry = ArchiveWriter(self.run_id) if ARCHIVE_TELEMETRY else None
+            if self.telemetry:
+                _, t, left, right, dist = frame
+                self.telemetry.append(t, left=left, right=right, dist=dist)
+            self.update("RACING", frame[1] / 1000.0, 0)
+            return False
+
+        if kind == "RECORD":
+            _, score, time_ms = frame
+            if self.telemetry:
+                self.telemetry.close()
+                self.telemetry = None
+            self.finished_run, self.run_id = self.run_id, None
+            finished_race = self.race_id
+            settlement = self.settle(time_ms / 1000.0, score)
+            if self.next_race:
+                self.race_id = self.next_race()
+            # This frame still shows the finished race; the next frame (burst or new run) moves to the new one
+            self.update("FINISHED", time_ms / 1000.0, score,
+                        {"settlement": settlement, "run_id": self.finished_run,
+                         "race_id": finished_race, "next_race_id": self.race_id})
+            return True
+
+        if kind == "BURST":
+            events = frame[1]
+            burst_run = self.finished_run or self.run_id or self.new_run_id()
+            self.finished_run = None
+            burst_file = save_burst(burst_run, events)
+            if ARCHIVE_TELEMETRY:
+                event_log = ArchiveWriter(burst_run, "events")
+                event_log.append_events(events)
+                event_log.close()
+            summary = summarize(events)
+            print(f"💾 {self.robot} BURST: {summary['events']} events saved to {burst_file}")
+            self.update("SYNCED", summary["timestamp"] / 1000.0, summary["final_score"],
+                        {"run_id": burst_run, "burst_file": burst_file, "summary": summary})
+            if self.commit_queue:
+                self.commit_queue.submit(burst_run, MerkleTree.from_events(events).root_hex, summary)
+            return True
+        return False
+
+    def settle(self, time_val, score_val):
+        """Settles this robot's race from the final record (replays are no-ops)"""
+        if self.ledger is None:
+            return None
+        try:
+            result = settle_race(self.ledger, self.race_id, time_val, score_val)
+        except Exception as e:
+            print(f"❌ {self.robot} SETTLEMENT FAILED: {e}")
+            return None
+        if not result["replayed"]:
+            print(f"💰 SETTLED race {self.race_id} ({self.robot}): {result['outcome']}, "
+                  f"{result['positions']} positions, pool {result['pool']:.2f}")
+        return result
+
+
+class Supervisor:
+    """
+    Reads every configured robot concurrently and publishes one combined state
+    frame: the first robot's state at the top level (what the web app shows)
+    plus every robot's state under "robots". open_port(name, port, baud)
+    builds each serial port (simulate.py passes in-memory ones).
+    """
+
+    def __init__(self, robots, state_bus, ledger=None, commit_queue=None, open_port=ReconnectingSerial):
+        self.state_bus = state_bus
+        self.ledger = ledger
+        self.last_race = max(r["race_id"] for r in robots)  # New races are allocated above every configured one
+        self.frames = queue.Queue(FRAME_QUEUE_SIZE)
+        self.primary = robots[0]["robot"]
+        self.sessions = {}
+        self.ingests = {}
+        self.ports = {}
+        self.run_owner = {}  # run_id -> robot, to route commit signatures back
+        for r in robots:
+            name = r["robot"]
+            self.sessions[name] = RobotSession(name, self.first_race(r["race_id"]), ledger, commit_queue,
+                                               self.next_race)
+            self.ports[name] = open_port(name, r["port"], r.get("baud", BAUD_RATE))
+            self.ingests[name] = SerialIngest(self.ports[name], protocol=r.get("protocol", "ascii"),
+                                              frames=self.frames, tag=name)
+        self.ui_interval = 1.0 / UI_UPDATE_HZ
+        self.last_publish = 0
+        self.last_stats = time.time()
+        self.last_snapshot = {"status": None, "time": 0.0}
+
+    def first_race(self, race_id):
+        """The configured race, or a new one if it was settled before a restart"""
+        if self.ledger is None:
+            return race_id
+        if self.ledger.settlement(race_id) is not None:
+            return self.next_race()
+        self.ledger.open_market(race_id)
+        return race_id
+
+    def next_race(self):
+        """A race id no robot has used, with its market open in the ledger"""
+        if self.ledger is not None:
+            self.last_race = self.ledger.open_race(after=self.last_race)
+        else:
+            self.last_race += 1
+        return self.last_race
+
+    def start(self):
+        for ingest in self.ingests.values():
+            ingest.start()
+        self.publish()
+        return self
+
+    def stop(self):
+        for ingest in self.ingests.values():
+            ingest.stop()
+        for name, ingest in self.ingests.items():
+            # Close each port once its reader is out of read()
+            ingest.stop(timeout=READ_TIMEOUT * 5)
+            self.ports[name].close()
+
+    def on_runs_committed(self, run_ids, signature):
+        # Runs on the commit queue thread: hand it to the main loop like any other frame
+        self.frames.put((None, ("COMMIT", run_ids, signature)))
+
+    def frame(self):
+        robots = {}
+        for name, session in self.sessions.items():
+            robots[name] = dict(session.state, connected=self.ports[name].connected,
+                                ingest=self.ingests[name].snapshot())
+        return dict(robots[self.primary], robots=robots, last_update=time.time())
+
+    def publish(self):
+        data = self.frame()
+        self.state_bus.publish(data)
+        for session in self.sessions.values():
+            session.dirty = False
+        self.last_publish = data["last_update"]
+        self.snapshot(data)
+
+    def snapshot(self, data):
+        if not WRITE_SNAPSHOT:
+            return
+        now, status = data["last_update"], data["status"]
+        if status == self.last_snapshot["status"] and now - self.last_snapshot["time"] < SNAPSHOT_INTERVAL:
+            return
+        self.last_snapshot = {"status": status, "time": now}
+        temp_file = STATE_FILE + ".tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_file, STATE_FILE)
+
+    def step(self, timeout):
+        """Handle everything queued (waiting up to `timeout`), then publish if due"""
+        urgent = False
+        for robot, frame in drain(self.frames, timeout):
+            if robot is None:
+                urgent |= self.record_commit(*frame[1:])
+                continue
+            session = self.sessions[robot]
+            urgent |= session.handle(frame)
+            if frame[0] == "BURST" and session.state.get("run_id"):
+                self.run_owner[session.state["run_id"]] = robot
+
+        now = time.time()
+        dirty = any(s.dirty for s in self.sessions.values())
+        if urgent or (dirty and now - self.last_publish >= self.ui_interval):
+            self.publish()
+
+        if now - self.last_stats >= STATS_INTERVAL:
+            self.print_stats()
+            self.last_stats = now
+
+    def record_commit(self, run_ids, signature):
+        for run_id in run_ids:
+            session = self.sessions.get(self.run_owner.pop(run_id, None))
+            if session:
+                session.state = dict(session.state, tx_signature=signature, tx_runs=run_ids)
+                session.dirty = True
+        return True
+
+    def print_stats(self):
+        totals = {"frames": 0, "dropped": 0, "bad": 0}
+        for ingest in self.ingests.values():
+            stats = ingest.snapshot()
+            for key in totals:
+                totals[key] += stats[key]
+        connected = sum(p.connected for p in self.ports.values())
+        print(f"📡 {connected}/{len(self.ports)} robots connected: {totals['frames']} frames, "
+              f"{totals['dropped']} dropped, {totals['bad']} bad, backlog {self.frames.qsize()}")
+
+    def run(self, duration=None):
+        end = time.time() + duration if duration else None
+        while end is None or time.time() < end:
+            try:
+                self.step(self.ui_interval)
+            except Exception as e:
+                print(f"Error: {e}")
+                time.sleep(1)
+
+
+# ===== PTY STAND-IN =====
+
+class PtyRobot:
+    """
+    Fake robot on a pseudo-terminal (POSIX only): `port` opens like a real
+    serial device and streams the ASCII protocol: LOG lines at `hz`, then the
+    final record and a data burst, then a new run.
+    """
+
+    def __init__(self, hz=100, run_seconds=10.0, pause=2.0, seed=0):
+        self.hz = hz
+        self.run_seconds = run_seconds
+        self.pause = pause
+        self.rng = random.Random(f"{seed}-pty")
+        self._master, self._slave = os.openpty()
+        self.port = os.ttyname(self._slave)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'pty-robot-{self.port}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        try:
+            self._stream()
+        except OSError:
+            pass  # Pseudo-terminal closed under us
+
+    def _stream(self):
+        # Same seeded streams as simulate.py, paced in real time
+        start = time.monotonic()
+        for t, chunk in robot_script(self.rng, self.hz, self.run_seconds, self.pause):
+            if self._stop.wait(max(0.0, start + t - time.monotonic())):
+                return
+            os.write(self._master, chunk)
+
+
+def _run_pty_robots(n, hz, run_seconds, conn):
+    # Own process, so the supervisor's CPU use can be measured on its own
+    robots = [PtyRobot(hz, run_seconds, seed=i).start() for i in range(n)]
+    conn.send([r.port for r in robots])
+    conn.recv()  # Parent closed the pipe or asked us to stop
+
+
+def start_pty_robots(n, hz=100, run_seconds=10.0):
+    """Start n stand-in robots in a child process; returns (robot configs, process)"""
+    parent, child = multiprocessing.Pipe()
+    proc = multiprocessing.Process(target=_run_pty_robots, args=(n, hz, run_seconds, child), daemon=True)
+    proc.start()
+    ports = parent.recv()
+    robots = [{"robot": f"pty-{i}", "port": port, "race_id": SIM_RACE_BASE + i} for i, port in enumerate(ports)]
+    return robots, proc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('config', nargs='?', help='robots JSON file')
+    parser.add_argument('--pty', type=int, metavar='N', help='run N stand-in robots on pseudo-terminals')
+    parser.add_argument('--hz', type=float, default=100, help='stand-in telemetry rate')
+    parser.add_argument('--run-seconds', type=float, default=10.0, help='stand-in run length')
+    parser.add_argument('--duration', type=float, help='stop after this many seconds and report CPU use')
+    args = parser.parse_args()
+    if not args.config and not args.pty:
+        parser.error('give a robots config file or --pty N')
+
+    # Stand-in runs are ghosts: no real settlement, no real chain
+    ghost = bool(args.pty)
+    if ghost:
+        robots, _ = start_pty_robots(args.pty, args.hz, args.run_seconds)
+    else:
+        robots = load_config(args.config)
+    print(f"🚀 Supervisor starting {len(robots)} robots (stand-ins: {ghost})")
+
+    ledger = SqliteLedger(LEDGER_DB) if SETTLE_ON_RECORD and not ghost else None
+    if ghost:
+        send_memo = FakeMemoSender(latency=0.5)
+    else:
+        try:
+            from solana_handler import SolanaOptimizer
+            send_memo = SolanaOptimizer(WALLET_PATH).send_memo
+        except Exception as e:
+            print(f"⚠️ Solana unavailable ({e}); runs stay in the outbox until next start")
+            send_memo = None
+
+    supervisor = None
+    commit_queue = CommitQueue(send_memo, on_commit=lambda ids, sig: supervisor.on_runs_committed(ids, sig),
+                               max_batch=COMMIT_BATCH)
+    supervisor = Supervisor(robots, StatePublisher(), ledger, commit_queue).start()
+    if send_memo:
+        commit_queue.start()
+
+    wall, cpu = time.time(), time.process_time()
+    try:
+        supervisor.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+    supervisor.print_stats()
+    supervisor.stop()
+    if args.duration:
+        elapsed = time.time() - wall
+        print(f"⏱ {elapsed:.1f}s: supervisor CPU {(time.process_time() - cpu) / elapsed * 100:.1f}% of one core")
+
+
+if __name__ == '__main__':
+    main()
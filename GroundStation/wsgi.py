@@ -0,0 +1,14 @@
+"""Production entry point: gunicorn -c gunicorn.conf.py wsgi:app"""
+import os
+from app import create_app, SECRET_KEY
+
+# Every worker shares state through the store and keeps sessions server-side,
+# so any worker can serve any request
+app = create_app({
+    'SECRET_KEY': os.environ.get('OLYMPIMARKET_SECRET_KEY', SECRET_KEY),
+    'STORE_BACKEND': os.environ.get('OLYMPIMARKET_STORE', 'sqlite'),
+    'STORE_URL': os.environ.get('OLYMPIMARKET_STORE_URL'),
+    'SESSION_TYPE': os.environ.get('OLYMPIMARKET_SESSION', 'filesystem'),
+    'METRICS_ENABLED': os.environ.get('OLYMPIMARKET_METRICS') == '1',
+    'DEMO_SEED': os.environ.get('OLYMPIMARKET_DEMO_SEED'),
+})